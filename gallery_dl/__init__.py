@@ -20,8 +20,12 @@ if sys.hexversion < 0x3030000:
     print("Python 3.3+ required", file=sys.stderr)
     sys.exit(1)
 
+import os
 import json
+import time
 import logging
+import sqlite3
+import datetime
 from . import version, config, option, extractor, job, util, exception
 
 __version__ = version.__version__
@@ -128,13 +132,54 @@ def prepare_range(rangespec, target):
 def prepare_filter(filterexpr, target):
     if filterexpr:
         try:
-            name = "<{} filter>".format(target)
-            codeobj = compile(filterexpr, name, "eval")
-            config.set(("_", target, "filter"), codeobj)
+            pred = util.FilterPredicate(filterexpr, target)
+            config.set(("_", target, "filter"), pred)
+            config.set(("_", target, "constraints"),
+                       util.parse_constraints(filterexpr))
         except (SyntaxError, ValueError, TypeError) as exc:
             log.warning(exc)
 
 
+def parse_since(value):
+    """Convert a 'YYYY-MM-DD' or 'Nd' string to a UNIX timestamp"""
+    if not value:
+        return None
+    if value[-1] in "dD":
+        return int(time.time() - float(value[:-1]) * 86400)
+    date = datetime.datetime.strptime(value, "%Y-%m-%d")
+    return int(time.mktime(date.timetuple()))
+
+
+def query_archive(args):
+    """Print statistics or entries of a download archive"""
+    try:
+        since = parse_since(args.archive_since)
+    except ValueError as exc:
+        log.error("Invalid --archive-since value: %s", exc)
+        return
+
+    path = util.expand_path(args.archive_stats or args.archive_export)
+    if not os.path.isfile(path):
+        log.error("Archive file '%s' does not exist", path)
+        return
+
+    try:
+        archive = util.DownloadArchive(path, readonly=True)
+        try:
+            if args.archive_stats:
+                for category, files, size in archive.summary(
+                        args.archive_category, since):
+                    print("{:<20} {:>8} files {:>16} bytes".format(
+                        str(category), files, size))
+            else:
+                for entry in archive.select(args.archive_category, since):
+                    print(json.dumps(entry, ensure_ascii=False))
+        finally:
+            archive.close()
+    except sqlite3.Error as exc:
+        log.error("Unable to read archive file '%s': %s", path, exc)
+
+
 def parse_inputfile(file):
     """Filter and process strings from an input file.
 
@@ -263,6 +308,8 @@ def main():
                 if hasattr(extr, "test") and extr.test:
                     print("Example :", extr.test[0][0])
                 print()
+        elif args.archive_stats or args.archive_export:
+            query_archive(args)
         else:
             if not args.urls and not args.inputfile:
                 parser.error(
@@ -6,8 +6,17 @@
 # https://github.com/rg3/youtube-dl/
 
 import base64
+import struct
+import functools
 from math import ceil
 
+try:
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.ciphers import (
+        Cipher, algorithms, modes)
+except ImportError:
+    Cipher = None
+
 BLOCK_SIZE_BYTES = 16
 
 
@@ -20,7 +29,7 @@ def aes_cbc_decrypt(data, key, iv):
     @param {int[]} iv          16-Byte IV
     @returns {int[]}           decrypted data
     """
-    expanded_key = key_expansion(key)
+    expanded_key = _key_expansion_cached(tuple(key))
     block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
 
     decrypted_data = []
@@ -47,11 +56,91 @@ def aes_cbc_decrypt_text(data, key, iv):
     @returns {string}          decrypted data as utf8 encoded string
     """
     data = base64.standard_b64decode(bytes(data, "ascii"))
-    charcodes = aes_cbc_decrypt(list(data), key, iv)
-    last = charcodes[-1]
+    data = aes_cbc_decrypt_bytes(data, bytes(key), bytes(iv))
+    last = data[-1]
     if last <= 16:
-        charcodes = charcodes[:-last]
-    return bytes(charcodes).decode()
+        data = data[:-last]
+    return data.decode()
+
+
+def aes_cbc_decrypt_bytes(data, key, iv):
+    """
+    Decrypt with aes in CBC mode
+
+    Uses the 'cryptography' package if available and a table-driven
+    pure-Python implementation otherwise.
+
+    @param {bytes} data        cipher
+    @param {bytes} key         16/24/32-Byte cipher key
+    @param {bytes} iv          16-Byte IV
+    @returns {bytes}           decrypted data
+    """
+    size = len(data)
+    if size % BLOCK_SIZE_BYTES:
+        data += bytes(BLOCK_SIZE_BYTES - size % BLOCK_SIZE_BYTES)
+
+    if Cipher:
+        decryptor = Cipher(
+            algorithms.AES(key), modes.CBC(iv), default_backend()
+        ).decryptor()
+        return (decryptor.update(data) + decryptor.finalize())[:size]
+    return aes_cbc_decrypt_words(
+        data, _key_expansion_words_cached(bytes(key)), iv)[:size]
+
+
+def aes_cbc_decrypt_words(data, round_keys, iv):
+    """
+    Decrypt with aes in CBC mode, using 32-bit words and lookup tables
+
+    @param {bytes} data        cipher; its length must be a multiple of 16
+    @param {int[]} round_keys  decryption key schedule as returned by
+                               key_expansion_words()
+    @param {bytes} iv          16-Byte IV
+    @returns {bytes}           decrypted data
+    """
+    td0, td1, td2, td3, si = TD0, TD1, TD2, TD3, SBOX_INV
+    rounds = len(round_keys) // 4 - 1
+    k0, k1, k2, k3 = round_keys[:4]
+    kl0, kl1, kl2, kl3 = round_keys[-4:]
+    inner = [round_keys[i:i+4] for i in range(4, rounds * 4, 4)]
+
+    words = struct.unpack(">{}I".format(len(data) // 4), data)
+    p0, p1, p2, p3 = struct.unpack(">4I", iv)
+    result = []
+    append = result.extend
+
+    for i in range(0, len(words), 4):
+        c0, c1, c2, c3 = words[i:i+4]
+        s0 = c0 ^ k0
+        s1 = c1 ^ k1
+        s2 = c2 ^ k2
+        s3 = c3 ^ k3
+
+        for r0, r1, r2, r3 in inner:
+            s0, s1, s2, s3 = (
+                td0[s0 >> 24] ^ td1[s3 >> 16 & 255] ^
+                td2[s2 >> 8 & 255] ^ td3[s1 & 255] ^ r0,
+                td0[s1 >> 24] ^ td1[s0 >> 16 & 255] ^
+                td2[s3 >> 8 & 255] ^ td3[s2 & 255] ^ r1,
+                td0[s2 >> 24] ^ td1[s1 >> 16 & 255] ^
+                td2[s0 >> 8 & 255] ^ td3[s3 & 255] ^ r2,
+                td0[s3 >> 24] ^ td1[s2 >> 16 & 255] ^
+                td2[s1 >> 8 & 255] ^ td3[s0 & 255] ^ r3,
+            )
+
+        append((
+            (si[s0 >> 24] << 24 | si[s3 >> 16 & 255] << 16 |
+             si[s2 >> 8 & 255] << 8 | si[s1 & 255]) ^ kl0 ^ p0,
+            (si[s1 >> 24] << 24 | si[s0 >> 16 & 255] << 16 |
+             si[s3 >> 8 & 255] << 8 | si[s2 & 255]) ^ kl1 ^ p1,
+            (si[s2 >> 24] << 24 | si[s1 >> 16 & 255] << 16 |
+             si[s0 >> 8 & 255] << 8 | si[s3 & 255]) ^ kl2 ^ p2,
+            (si[s3 >> 24] << 24 | si[s2 >> 16 & 255] << 16 |
+             si[s1 >> 8 & 255] << 8 | si[s0 & 255]) ^ kl3 ^ p3,
+        ))
+        p0, p1, p2, p3 = c0, c1, c2, c3
+
+    return struct.pack(">{}I".format(len(result)), *result)
 
 
 def key_expansion(data):
@@ -95,6 +184,42 @@ def key_expansion(data):
     return data
 
 
+@functools.lru_cache(maxsize=16)
+def _key_expansion_cached(key):
+    return key_expansion(list(key))
+
+
+@functools.lru_cache(maxsize=16)
+def _key_expansion_words_cached(key):
+    return tuple(key_expansion_words(list(key)))
+
+
+def key_expansion_words(data):
+    """
+    Generate key schedule for aes_cbc_decrypt_words()
+
+    Round keys are in reverse order, with InvMixColumns already applied
+    to all but the first and last one ("equivalent inverse cipher").
+
+    @param {int[]} data  16/24/32-Byte cipher key
+    @returns {int[]}     44/52/60 32-bit round key words
+    """
+    expanded_key = key_expansion(data)
+    words = struct.unpack(
+        ">{}I".format(len(expanded_key) // 4), bytes(expanded_key))
+
+    td0, td1, td2, td3, sbox = TD0, TD1, TD2, TD3, SBOX
+    result = []
+    last = len(words) - 4
+    for i in range(last, -1, -4):
+        for w in words[i:i+4]:
+            if 0 < i < last:
+                w = (td0[sbox[w >> 24]] ^ td1[sbox[w >> 16 & 255]] ^
+                     td2[sbox[w >> 8 & 255]] ^ td3[sbox[w & 255]])
+            result.append(w)
+    return result
+
+
 def aes_decrypt(data, expanded_key):
     """
     Decrypt one block with aes
@@ -334,4 +459,21 @@ def shift_rows_inv(data):
     return data_shifted
 
 
-__all__ = ['key_expansion', 'aes_cbc_decrypt', 'aes_cbc_decrypt_text']
+def _build_tables():
+    """Build T-tables combining InvSubBytes and InvMixColumns"""
+    td0 = []
+    for x in SBOX_INV:
+        td0.append(rijndael_mul(x, 0x0e) << 24 | rijndael_mul(x, 0x09) << 16 |
+                   rijndael_mul(x, 0x0d) << 8 | rijndael_mul(x, 0x0b))
+    td1 = [(w >> 8 | w << 24) & 0xffffffff for w in td0]
+    td2 = [(w >> 8 | w << 24) & 0xffffffff for w in td1]
+    td3 = [(w >> 8 | w << 24) & 0xffffffff for w in td2]
+    return tuple(td0), tuple(td1), tuple(td2), tuple(td3)
+
+
+TD0, TD1, TD2, TD3 = _build_tables()
+
+
+__all__ = ['key_expansion', 'key_expansion_words',
+           'aes_cbc_decrypt', 'aes_cbc_decrypt_bytes',
+           'aes_cbc_decrypt_words', 'aes_cbc_decrypt_text']
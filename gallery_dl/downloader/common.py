@@ -9,8 +9,11 @@
 """Common classes and constants used by downloader modules."""
 
 import os
+import re
 import time
+import hashlib
 import logging
+import collections
 from .. import config, util, exception
 from requests.exceptions import RequestException
 
@@ -27,6 +30,18 @@ class DownloaderBase():
         self.downloading = False
         self.part = self.config("part", True)
         self.partdir = self.config("part-directory")
+        self.hashes = self.config("hashes") or ()
+        self.verify_md5 = self.config("verify-md5", False)
+        self.preallocate = self.config("preallocate", False)
+        self.allocated = None
+
+        if self.preallocate and not hasattr(os, "posix_fallocate"):
+            self.log.warning("'preallocate' is not supported on this platform")
+            self.preallocate = False
+        if isinstance(self.hashes, str):
+            self.hashes = (self.hashes,)
+        for algorithm in self.hashes:
+            hashlib.new(algorithm)
 
         if self.partdir:
             self.partdir = util.expand_path(self.partdir)
@@ -54,14 +69,25 @@ class DownloaderBase():
     def download_impl(self, url, pathfmt):
         """Actual implementaion of the download process"""
         adj_ext = None
+        corrupt = False
         tries = 0
         msg = ""
 
         if self.part:
             pathfmt.part_enable(self.partdir)
+        pathfmt.keywords.pop("_hashes", None)
 
         while True:
             self.reset()
+
+            # discard data that failed verification
+            if corrupt:
+                corrupt = False
+                try:
+                    os.unlink(pathfmt.temppath)
+                except OSError:
+                    pass
+
             if tries:
                 self.log.warning("%s (%d/%d)", msg, tries, self.retries)
                 if tries >= self.retries:
@@ -100,19 +126,48 @@ class DownloaderBase():
                     pathfmt.temppath = ""
                     return True
 
+            md5 = self._expected_md5(pathfmt.keywords)
+            algorithms = list(self.hashes)
+            if md5 and "md5" not in algorithms:
+                algorithms.append("md5")
+
             self.out.start(pathfmt.path)
             self.downloading = True
-            with pathfmt.open(mode) as file:
-                if offset:
+            if offset:
+                output = self._open(pathfmt, mode, offset, size)
+                # check the header of already downloaded data
+                adj_ext = self._check_extension(
+                    output.read(HEADER_SIZE), pathfmt)
+            else:
+                # check the header of the first received data and adjust
+                # the filename extension before creating the output file
+                output = DeferredFile(lambda header: self._open(
+                    pathfmt, mode, offset, size, header))
+                adj_ext = None
+
+            with output as file:
+                if algorithms:
+                    file = HashingFile(file, algorithms, offset)
+                elif offset:
                     file.seek(offset)
 
                 # download content
                 try:
                     self.receive(file)
+                    output.flush()
                 except RequestException as exc:
                     msg = exc
                     print()
                     continue
+                except exception.DownloadComplete:
+                    # a file with the detected extension already exists
+                    print()
+                    self.downloading = False
+                    pathfmt.temppath = ""
+                    return True
+                finally:
+                    if self.allocated:
+                        self._truncate(pathfmt)
 
                 # check filesize
                 if size and file.tell() < size:
@@ -120,8 +175,15 @@ class DownloaderBase():
                         file.tell(), size)
                     continue
 
-                # check filename extension
-                adj_ext = self._check_extension(file, pathfmt)
+                if algorithms:
+                    digests = file.digests()
+                    # check md5 hash
+                    if md5 and digests["md5"] != md5:
+                        msg = "MD5 mismatch ({} != {})".format(
+                            digests["md5"], md5)
+                        corrupt = True
+                        continue
+                    pathfmt.keywords["_hashes"] = digests
 
             break
 
@@ -148,22 +210,248 @@ class DownloaderBase():
     def get_extension(self):
         """Return a filename extension appropriate for the current request"""
 
+    def _expected_md5(self, keywords):
+        """Return the md5 hash a file should have, if it is to be verified"""
+        if self.verify_md5:
+            md5 = keywords.get("md5")
+            if isinstance(md5, str) and MD5_RE.match(md5):
+                return md5.lower()
+        return None
+
+    def _open(self, pathfmt, mode, offset, size, header=None):
+        """Open the output file for data starting at 'offset'
+
+        'header', the first bytes of a new file, is used to adjust its
+        filename extension beforehand.
+        """
+        if header is not None:
+            self._adjust_extension(pathfmt, header)
+        file = pathfmt.open(mode)
+        if offset:
+            # discard everything after 'offset', e.g. the unused space
+            # of a file preallocated by an interrupted download
+            file.truncate(offset)
+            pathfmt.set_part_size(None)
+        if self.preallocate and size > offset:
+            file = self._preallocate(pathfmt, file, offset, size)
+        return file
+
+    def _preallocate(self, pathfmt, file, offset, size):
+        """Reserve disk space for all 'size' bytes of 'file'
+
+        Since this changes its size, the amount of valid data gets stored
+        separately for part_size() until _truncate() gets called.
+        Returns 'file' or a wrapper keeping this value up to date.
+        """
+        try:
+            fileno = file.fileno()
+        except (AttributeError, OSError):
+            # not a regular file
+            return file
+        pathfmt.set_part_size(offset)
+        try:
+            os.posix_fallocate(fileno, offset, size - offset)
+        except OSError as exc:
+            self.log.debug("Unable to preallocate %d bytes: %s", size, exc)
+            pathfmt.set_part_size(None)
+            return file
+        self.allocated = file = PreallocatedFile(file, pathfmt)
+        return file
+
+    def _truncate(self, pathfmt):
+        """Remove unused preallocated space after the current position"""
+        file, self.allocated = self.allocated, None
+        file.truncate()
+        pathfmt.set_part_size(None)
+
+    def _adjust_extension(self, pathfmt, header):
+        """Set the filename extension matching 'header'
+
+        Gets called with the first bytes of a new file before it is
+        created and raises DownloadComplete if a file with the adjusted
+        name already exists.
+        """
+        extension = self._check_extension(header, pathfmt)
+        if not extension:
+            return
+
+        # rename the temporary file if its name depends on the extension
+        rename = os.path.basename(pathfmt.temppath) in (
+            pathfmt.filename, pathfmt.filename + ".part")
+        pathfmt.set_extension(extension)
+        if rename:
+            pathfmt.temppath = ""
+            pathfmt.build_path()
+            if self.part:
+                pathfmt.part_enable(self.partdir)
+
+        # exists() raises StopExtraction or SystemExit for 'skip: abort'
+        # and 'skip: exit', in which case download() must not remove
+        # 'temppath', the path of the existing file without 'part'
+        self.downloading = False
+        if pathfmt.exists():
+            raise exception.DownloadComplete()
+        self.downloading = True
+
     @staticmethod
-    def _check_extension(file, pathfmt):
-        """Check filename extension against fileheader"""
+    def _check_extension(header, pathfmt):
+        """Return the extension matching 'header' if the current one doesn't"""
         extension = pathfmt.keywords["extension"]
-        if extension in FILETYPE_CHECK:
-            file.seek(0)
-            header = file.read(8)
-            if len(header) >= 8 and not FILETYPE_CHECK[extension](header):
-                for ext, check in FILETYPE_CHECK.items():
-                    if ext != extension and check(header):
-                        return ext
+        if extension in FILETYPE_CHECK and len(header) >= 8 and \
+                not FILETYPE_CHECK[extension](header):
+            for ext, check in FILETYPE_CHECK.items():
+                if ext != extension and check(header):
+                    return ext
         return None
 
 
+class PreallocatedFile():
+    """Wrapper around a preallocated file object
+
+    Stores the amount of data written so far every 'PART_SIZE_INTERVAL'
+    bytes, so a download can resume from there after its process has
+    been killed.
+    """
+
+    def __init__(self, file, pathfmt):
+        self.file = file
+        self.pathfmt = pathfmt
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        if self.written >= PART_SIZE_INTERVAL:
+            self.written = 0
+            result = self.file.write(data)
+            self.file.flush()
+            self.pathfmt.set_part_size(self.file.tell())
+            return result
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+
+
+class DeferredFile():
+    """File object that creates its actual output file on demand
+
+    Written data gets buffered until 'HEADER_SIZE' bytes are available or
+    flush() gets called. 'opener' then receives these first bytes and
+    returns the file object to write all data to, which allows it to
+    change the filename beforehand.
+    """
+
+    def __init__(self, opener):
+        self.opener = opener
+        self.buffer = b""
+        self.file = None
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= HEADER_SIZE:
+            self._open()
+        return len(data)
+
+    def tell(self):
+        return self.file.tell() if self.file else len(self.buffer)
+
+    def flush(self):
+        """Create the output file and write all buffered data to it"""
+        if not self.file:
+            self._open()
+
+    def _open(self):
+        header, self.buffer = self.buffer, b""
+        self.file = self.opener(header)
+        self.file.write(header)
+        # pass all further data directly to the output file
+        self.write = self.file.write
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # let the output file handle its own cleanup, since it might be
+        # something other than a regular file (e.g. a ZipEntry)
+        if self.file:
+            self.file.__exit__(exc_type, exc_value, traceback)
+
+
+class HashingFile():
+    """Wrapper around a file object to compute digests of all written data
+
+    When resuming a download at 'offset', the already existing data gets
+    read and hashed first.
+    """
+
+    def __init__(self, file, algorithms, offset=0):
+        self.file = file
+        self.hashes = collections.OrderedDict(
+            (algorithm, hashlib.new(algorithm)) for algorithm in algorithms)
+        if offset:
+            file.seek(0)
+            remaining = offset
+            while remaining:
+                data = file.read(min(remaining, 65536))
+                if not data:
+                    break
+                self._update(data)
+                remaining -= len(data)
+            file.seek(offset)
+
+    def write(self, data):
+        self._update(data)
+        return self.file.write(data)
+
+    def digests(self):
+        """Return an ordered mapping of algorithm names to hex digests"""
+        return collections.OrderedDict(
+            (algorithm, hashobj.hexdigest())
+            for algorithm, hashobj in self.hashes.items())
+
+    def _update(self, data):
+        for hashobj in self.hashes.values():
+            hashobj.update(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+MD5_RE = re.compile(r"^[0-9a-fA-F]{32}$")
+
+# number of bytes to check signatures against
+HEADER_SIZE = 256
+
+# number of bytes after which to store the size of a preallocated file
+PART_SIZE_INTERVAL = 4 * 1024 * 1024
+
+MP4_BRANDS = (
+    b"iso", b"mp4", b"avc1", b"dash", b"M4V", b"mmp4", b"MSNV", b"f4v")
+
+
+def _check_svg(header):
+    header = header.lstrip()
+    return header.startswith(b"<svg") or (
+        header.startswith((b"<?xml", b"<!DOCTYPE svg")) and b"<svg" in header)
+
+
 FILETYPE_CHECK = {
-    "jpg": lambda h: h[0:2] == b"\xff\xd8",
-    "png": lambda h: h[0:8] == b"\x89\x50\x4e\x47\x0d\x0a\x1a\x0a",
-    "gif": lambda h: h[0:4] == b"GIF8" and h[5] == 97,
+    "jpg" : lambda h: h[0:2] == b"\xff\xd8",
+    "png" : lambda h: h[0:8] == b"\x89\x50\x4e\x47\x0d\x0a\x1a\x0a",
+    "gif" : lambda h: h[0:4] == b"GIF8" and h[5] == 97,
+    "webp": lambda h: h[0:4] == b"RIFF" and h[8:12] == b"WEBP",
+    "bmp" : lambda h: h[0:2] == b"BM" and h[6:10] == b"\0\0\0\0",
+    "svg" : _check_svg,
+    "mp4" : lambda h: h[4:8] == b"ftyp" and h[8:12].startswith(MP4_BRANDS),
+    "webm": lambda h: h[0:4] == b"\x1a\x45\xdf\xa3" and b"webm" in h[:64],
+    "ogg" : lambda h: h[0:4] == b"OggS",
+    "mp3" : lambda h: h[0:3] == b"ID3" or (
+        h[0] == 0xFF and (h[1] & 0xE6) == 0xE2),
+    "zip" : lambda h: h[0:4] == b"PK\x03\x04",
 }
@@ -149,6 +149,19 @@ class TagMixin():
     def get_metadata(self):
         return {"search_tags": self.tags}
 
+    def constrain(self, constraints, queue=False):
+        if queue:
+            return
+        tags = [
+            "{}:{}{}".format(key, "" if op == "==" else op, value)
+            for key, op, value in constraints
+            if key in ("id", "score") and
+            isinstance(value, int) and not isinstance(value, bool)
+        ]
+        if tags:
+            self.log.debug("Adding search tags: %s", " ".join(tags))
+            self.params["tags"] = " ".join([self.tags] + tags)
+
 
 class PoolMixin():
     """Extraction of image-pools"""
@@ -30,10 +30,13 @@ class Extractor():
     filename_fmt = "{name}.{extension}"
     archive_fmt = ""
     cookiedomain = ""
+    encoding = None
+    detections = 0
 
     def __init__(self):
         self.session = requests.Session()
         self.log = logging.getLogger(self.category)
+        self.encoding = self.config("encoding", self.encoding)
         self._set_headers()
         self._set_cookies()
         self._set_proxies()
@@ -45,8 +48,26 @@ class Extractor():
         yield Message.Version, 1
 
     def skip(self, num):
+        """Skip the first 'num' files and return how many were skipped
+
+        Extractors without a way to jump ahead return 0 and let the
+        range predicate discard files one by one.
+        """
+        return 0
+
+    def skip_queue(self, num):
+        """Like skip(), but for the first 'num' Queue messages"""
         return 0
 
+    def constrain(self, constraints, queue=False):
+        """Narrow down API queries according to filter constraints
+
+        'constraints' is a list of (key, operator, value)-tuples as returned
+        by util.parse_constraints() for the --filter expression
+        (or --chapter-filter if 'queue' is True). Every result must still
+        be able to satisfy them; the actual filter is applied regardless.
+        """
+
     def config(self, key, default=None):
         return config.interpolate(
             ("extractor", self.category, self.subcategory, key), default)
@@ -64,8 +85,11 @@ class Extractor():
             else:
                 code = response.status_code
                 if 200 <= code < 400 or code in expect:
+                    encoding = encoding or self.encoding
                     if encoding:
                         response.encoding = encoding
+                    elif not kwargs.get("stream"):
+                        self._set_encoding(response)
                     return response
 
                 msg = "{} HTTP Error: {} for url: {}".format(
@@ -82,6 +106,30 @@ class Extractor():
 
         raise exception.HttpError(msg)
 
+    def _set_encoding(self, response):
+        """Set a response's encoding if its headers don't specify one
+
+        Try UTF-8 first and only fall back to requests' slow
+        character detection (chardet) if the content isn't valid UTF-8.
+        """
+        ctype = response.headers.get("Content-Type", "").lower()
+        if "charset=" in ctype or ctype and not (
+                ctype.startswith("text/") or "json" in ctype or
+                "javascript" in ctype or "xml" in ctype):
+            return
+        try:
+            response.content.decode("utf-8")
+        except UnicodeDecodeError:
+            if response.encoding is None:
+                Extractor.detections += 1
+                self.log.warning(
+                    "Detecting character encoding of '%s' (%d so far); "
+                    "consider setting the 'encoding' option",
+                    response.url, Extractor.detections)
+                response.encoding = response.apparent_encoding
+        else:
+            response.encoding = "utf-8"
+
     def _get_auth_info(self):
         """Return authentication information as (username, password) tuple"""
         username = self.config("username")
@@ -310,13 +310,30 @@ class DeviantartFavoriteExtractor(DeviantartExtractor):
     def deviations(self):
         folders = self.api.collections_folders(self.user)
         if self.flat:
-            return itertools.chain.from_iterable([
-                self.api.collections(self.user, folder["folderid"])
-                for folder in folders
-            ])
+            return self._collections(folders)
         else:
             return self._folder_urls(folders, "favourites")
 
+    def _collections(self, folders):
+        """Yield deviations of all 'folders' starting at 'self.offset'"""
+        offset = self.offset
+        for folder in folders:
+            size = folder.get("size")
+            if size is None:
+                # unknown folder size: discard deviations one by one
+                for deviation in self.api.collections(
+                        self.user, folder["folderid"]):
+                    if offset:
+                        offset -= 1
+                    else:
+                        yield deviation
+            elif offset >= size:
+                offset -= size
+            else:
+                yield from self.api.collections(
+                    self.user, folder["folderid"], offset)
+                offset = 0
+
 
 class DeviantartCollectionExtractor(DeviantartExtractor):
     """Extractor for a single favorite collection"""
@@ -465,7 +482,7 @@ class DeviantartAPI():
         """Yield all collection folders of a specific user"""
         endpoint = "collections/folders"
         params = {"username": username, "offset": offset, "limit": 50,
-                  "mature_content": self.mature}
+                  "calculate_size": "true", "mature_content": self.mature}
         return self._pagination_list(endpoint, params)
 
     def deviation(self, deviation_id):
@@ -270,6 +270,11 @@ class ExhentaiSearchExtractor(ExhentaiExtractor):
         self.params = text.parse_query(match.group(1) or "")
         self.params["page"] = text.parse_int(self.params.get("page"))
         self.url = self.root
+        self.offset = 0
+
+    def skip_queue(self, num):
+        self.offset += num
+        return num
 
     def items(self):
         self.login()
@@ -278,11 +283,26 @@ class ExhentaiSearchExtractor(ExhentaiExtractor):
 
         while True:
             page = self.request(self.url, params=self.params).text
-
-            for row in text.extract_iter(page, '<tr class="gtr', '</tr>'):
+            rows = list(text.extract_iter(page, '<tr class="gtr', '</tr>'))
+            last = ('class="ptdd">&gt;<' in page or
+                    ">No hits found</p>" in page)
+
+            if self.offset:
+                # the number of results per page is a user setting;
+                # use the size of the first page to jump ahead
+                if rows and not last and self.offset >= len(rows):
+                    pages = self.offset // len(rows)
+                    self.params["page"] += pages
+                    self.offset -= pages * len(rows)
+                    self.wait()
+                    continue
+                rows = rows[self.offset:]
+                self.offset = 0
+
+            for row in rows:
                 yield self._parse_row(row)
 
-            if 'class="ptdd">&gt;<' in page or ">No hits found</p>" in page:
+            if last:
                 return
             self.params["page"] += 1
             self.wait()
@@ -290,23 +310,23 @@ class ExhentaiSearchExtractor(ExhentaiExtractor):
     def init(self):
         pass
 
-    def _parse_row(self, row, extr=text.extract):
+    def _parse_row(self, row, extr=text.compile_rules((
+            ("type" , ' alt="', '"'),
+            ("date" , 'nowrap">', '<'),
+            ("url"  , ' class="it5"><a href="', '"'),
+            ("title", '>', '<'),
+    ))):
         """Parse information of a single result row"""
-        gtype, pos = extr(row, ' alt="', '"')
-        date , pos = extr(row, 'nowrap">', '<', pos)
-        url  , pos = extr(row, ' class="it5"><a href="', '"', pos)
-        title, pos = extr(row, '>', '<', pos)
-        key , last = self._parse_last(row, pos)
+        data, pos = extr(row)
+        key, last = self._parse_last(row, pos)
+        url = data.pop("url")
         parts = url.rsplit("/", 3)
 
-        return Message.Queue, url, {
-            "type": gtype,
-            "date": date,
-            "gallery_id": text.parse_int(parts[1]),
-            "gallery_token": parts[2],
-            "title": text.unescape(title),
-            key: last,
-        }
+        data["gallery_id"] = text.parse_int(parts[1])
+        data["gallery_token"] = parts[2]
+        data["title"] = text.unescape(data["title"])
+        data[key] = last
+        return Message.Queue, url, data
 
     def _parse_last(self, row, pos):
         """Parse the last column of a result row"""
@@ -16,6 +16,7 @@ class FlickrExtractor(Extractor):
     """Base class for flickr extractors"""
     category = "flickr"
     filename_fmt = "{category}_{id}.{extension}"
+    upload_date_filter = False
 
     def __init__(self, match):
         Extractor.__init__(self)
@@ -37,6 +38,26 @@ class FlickrExtractor(Extractor):
         self.user = self.api.urls_lookupUser(self.item_id)
         return {"user": self.user}
 
+    def skip(self, num):
+        api = self.api
+        pages = num // api.per_page
+        api.page_start += pages
+        return pages * api.per_page
+
+    def constrain(self, constraints, queue=False):
+        if queue or not self.upload_date_filter:
+            return
+        api = self.api
+        for key, op, value in constraints:
+            if key != "dateupload" or not isinstance(value, int):
+                continue
+            if op in (">", ">=", "=="):
+                api.upload_date["min_upload_date"] = value
+            if op in ("<", "<=", "=="):
+                api.upload_date["max_upload_date"] = value
+            if "date_upload" not in api.extras:
+                api.extras.append("date_upload")
+
     def photos(self):
         return []
 
@@ -71,6 +92,9 @@ class FlickrImageExtractor(FlickrExtractor):
                         "vwxyzABCDEFGHJKLMNPQRSTUVWXYZ")
             self.item_id = util.bdecode(match.group(2), alphabet)
 
+    def skip(self, num):
+        return 0
+
     def items(self):
         size = self.api.photos_getSizes(self.item_id)[-1]
 
@@ -193,6 +217,7 @@ class FlickrUserExtractor(FlickrExtractor):
     subcategory = "user"
     directory_fmt = ["{category}", "{user[username]}"]
     archive_fmt = "u_{user[nsid]}_{id}"
+    upload_date_filter = True
     pattern = [r"(?:https?://)?(?:www\.)?flickr\.com/photos/([^/]+)/?$"]
     test = [("https://www.flickr.com/photos/shona_s/", {
         "url": "d125b536cd8c4229363276b6c84579c394eec3a2",
@@ -223,6 +248,7 @@ class FlickrSearchExtractor(FlickrExtractor):
     subcategory = "search"
     directory_fmt = ["{category}", "{subcategory}", "{search[text]}"]
     archive_fmt = "s_{search}_{id}"
+    upload_date_filter = True
     pattern = [r"(?:https?://)?(?:www\.)?flickr\.com/search/?\?([^#]+)"]
     test = [
         (("https://flickr.com/search/?text=mountain"), None),
@@ -282,7 +308,11 @@ class FlickrAPI(oauth.OAuth1API):
         else:
             self.formats = self.FORMATS
         self.formats = self.formats[:4]
+        self.extras = ["url_" + fmt[0] for fmt in self.formats]
+        self.upload_date = {}
         self.subcategory = extractor.subcategory
+        self.per_page = 500
+        self.page_start = 1
 
     def favorites_getList(self, user_id):
         """Returns a list of the user's favorite photos."""
@@ -312,6 +342,7 @@ class FlickrAPI(oauth.OAuth1API):
     def people_getPhotos(self, user_id):
         """Return photos from the given user's photostream."""
         params = {"user_id": user_id}
+        params.update(self.upload_date)
         return self._listing("people.getPhotos", params)
 
     def photos_getInfo(self, photo_id):
@@ -338,7 +369,9 @@ class FlickrAPI(oauth.OAuth1API):
 
     def photos_search(self, params):
         """Return a list of photos matching some criteria."""
-        return self._listing("photos.search", params.copy())
+        params = params.copy()
+        params.update(self.upload_date)
+        return self._listing("photos.search", params)
 
     def photosets_getPhotos(self, photoset_id):
         """Get the list of photos in a set."""
@@ -373,8 +406,9 @@ class FlickrAPI(oauth.OAuth1API):
         return data
 
     def _pagination(self, method, params):
-        params["extras"] = ",".join("url_" + fmt[0] for fmt in self.formats)
-        params["page"] = 1
+        params["extras"] = ",".join(self.extras)
+        params["per_page"] = self.per_page
+        params["page"] = self.page_start
 
         while True:
             data = self._call(method, params)
@@ -400,6 +434,8 @@ class FlickrAPI(oauth.OAuth1API):
                 yield photo
 
     def _extract_format(self, photo):
+        if "dateupload" in photo:
+            photo["dateupload"] = text.parse_int(photo["dateupload"])
         for fmt, fmtname, fmtwidth in self.formats:
             key = "url_" + fmt
             if key in photo:
@@ -39,10 +39,11 @@ class FoolslideExtractor(SharedConfigExtractor):
     """Base class for FoOlSlide extractors"""
     basecategory = "foolslide"
     scheme = "https"
+    encoding = "utf-8"
 
     def request(self, url):
         return SharedConfigExtractor.request(
-            self, url, encoding="utf-8", method="post", data={"adult": "true"})
+            self, url, method="post", data={"adult": "true"})
 
     @staticmethod
     def parse_chapter_url(url, data):
@@ -121,25 +122,25 @@ class FoolslideChapterExtractor(FoolslideExtractor):
 class FoolslideMangaExtractor(FoolslideExtractor, MangaExtractor):
     """Base class for manga extractors for FoOlSlide based sites"""
 
-    def chapters(self, page):
+    def chapters(self, page, extr=text.compile_rules((
+            ("manga" , '<h1 class="title">', '</h1>'),
+            ("author", '<b>Author</b>: ', '<br'),
+            ("artist", '<b>Artist</b>: ', '<br'),
+    )), extr_chapter=text.compile_rules((
+            ("url"           , '<div class="title"><a href="', '"'),
+            ("chapter_string", 'title="', '"'),
+            ("group"         , 'title="', '"'),
+    ))):
         """Return a list of all chapter urls"""
-        manga , pos = text.extract(page, '<h1 class="title">', '</h1>')
-        author, pos = text.extract(page, '<b>Author</b>: ', '<br', pos)
-        artist, pos = text.extract(page, '<b>Artist</b>: ', '<br', pos)
-        manga = text.unescape(manga).strip()
+        manga, pos = extr(page)
+        manga["manga"] = text.unescape(manga["manga"]).strip()
 
         results = []
         while True:
-            url, pos = text.extract(
-                page, '<div class="title"><a href="', '"', pos)
+            data, pos = extr_chapter(page, pos, manga.copy())
+            url = data.pop("url")
             if not url:
                 return results
 
-            chapter, pos = text.extract(page, 'title="', '"', pos)
-            group  , pos = text.extract(page, 'title="', '"', pos)
-
-            results.append((url, self.parse_chapter_url(url, {
-                "manga": manga, "author": author, "artist": artist,
-                "group": group, "chapter_string": chapter,
-                "title": chapter.partition(": ")[2] or "",
-            })))
+            data["title"] = data["chapter_string"].partition(": ")[2] or ""
+            results.append((url, self.parse_chapter_url(url, data)))
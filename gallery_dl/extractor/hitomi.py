@@ -34,32 +34,29 @@ class HitomiGalleryExtractor(ChapterExtractor):
         url = "https://hitomi.la/galleries/{}.html".format(self.gid)
         ChapterExtractor.__init__(self, url)
 
-    def get_metadata(self, page, extr=text.extract):
+    def get_metadata(self, page, extr=text.compile_rules((
+            ("title"     , '.html">', '<'),
+            ("artist"    , '<h2>', '</h2>'),
+            ("group"     , '<td>Group</td><td>', '</td>'),
+            ("type"      , '<td>Type</td><td>', '</td>'),
+            ("language"  , '<td>Language</td><td>', '</td>'),
+            ("series"    , '<td>Series</td><td>', '</td>'),
+            ("characters", '<td>Characters</td><td>', '</td>'),
+            ("tags"      , '<td>Tags</td><td>', '</td>'),
+            ("date"      , '<span class="date">', '</span>'),
+    ))):
         pos = page.index('<h1><a href="/reader/')
-        title , pos = extr(page, '.html">', '<', pos)
-        artist, pos = extr(page, '<h2>', '</h2>', pos)
-        group , pos = extr(page, '<td>Group</td><td>', '</td>', pos)
-        gtype , pos = extr(page, '<td>Type</td><td>', '</td>', pos)
-        lang  , pos = extr(page, '<td>Language</td><td>', '</td>', pos)
-        series, pos = extr(page, '<td>Series</td><td>', '</td>', pos)
-        chars , pos = extr(page, '<td>Characters</td><td>', '</td>', pos)
-        tags  , pos = extr(page, '<td>Tags</td><td>', '</td>', pos)
-        date  , pos = extr(page, '<span class="date">', '</span>', pos)
-        lang = None if lang == "N/A" else text.remove_html(lang)
+        data = extr(page, pos, {"gallery_id": self.gid})[0]
 
-        return {
-            "gallery_id": self.gid,
-            "title": text.unescape(" ".join(title.split())),
-            "artist": self._prepare(artist),
-            "group": self._prepare(group),
-            "type": text.remove_html(gtype).capitalize(),
-            "lang": util.language_to_code(lang),
-            "language": lang,
-            "date": date,
-            "series": self._prepare(series),
-            "characters": self._prepare(chars),
-            "tags": self._prepare(tags),
-        }
+        lang = data["language"]
+        lang = None if lang == "N/A" else text.remove_html(lang)
+        data["language"] = lang
+        data["lang"] = util.language_to_code(lang)
+        data["title"] = text.unescape(" ".join(data["title"].split()))
+        data["type"] = text.remove_html(data["type"]).capitalize()
+        for key in ("artist", "group", "series", "characters", "tags"):
+            data[key] = self._prepare(data[key])
+        return data
 
     def get_images(self, page):
         subdomain = chr(97 + self.gid % 2) + "a"
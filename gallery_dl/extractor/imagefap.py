@@ -10,6 +10,7 @@
 
 from .common import Extractor, Message
 from .. import text
+import itertools
 import json
 
 
@@ -47,7 +48,15 @@ class ImagefapGalleryExtractor(ImagefapExtractor):
 
     def items(self):
         url = "{}/pictures/{}/".format(self.root, self.gid)
-        page = self.request(url).text
+        response = self.request(url, stream=True)
+        page = ""
+        # stop downloading the (potentially huge) gallery page
+        # after everything needed for 'get_job_metadata()' has arrived
+        for chunk in text.iter_stream(response):
+            page += chunk
+            if text.extract(page, 'id="img_ed_', '"')[0]:
+                break
+        response.close()
         data = self.get_job_metadata(page)
         yield Message.Version, 1
         yield Message.Directory, data
@@ -73,16 +82,19 @@ class ImagefapGalleryExtractor(ImagefapExtractor):
         url = "{}/photo/{}/".format(self.root, self.image_id)
         params = {"gid": self.gid, "idx": 0, "partial": "true"}
         while True:
-            pos = 0
-            page = self.request(url, params=params).text
-            for _ in range(24):
-                imgurl, pos = text.extract(page, '<a href="', '"', pos)
-                if not imgurl:
-                    return
+            response = self.request(url, params=params, stream=True)
+            # read all URLs of a page before yielding any of them,
+            # which would keep its connection idle during downloads
+            imgurls = list(itertools.islice(text.extract_iter_stream(
+                response, '<a href="', '"'), 24))
+            response.close()
+            for imgurl in imgurls:
                 num += 1
                 _, imgid, name = imgurl.rsplit("/", 2)
                 data = {"image_id": imgid, "num": num}
                 yield imgurl, text.nameext_from_url(name, data)
+            if num < params["idx"] + 24:
+                return
             params["idx"] += 24
 
 
@@ -22,7 +22,6 @@ class ImagehostImageExtractor(Extractor):
     method = "post"
     params = "simple"
     cookies = None
-    encoding = None
 
     def __init__(self, match):
         Extractor.__init__(self)
@@ -50,7 +49,6 @@ class ImagehostImageExtractor(Extractor):
             method=self.method,
             data=self.params,
             cookies=self.cookies,
-            encoding=self.encoding,
         ).text
 
         url, filename = self.get_info(page)
@@ -28,6 +28,7 @@ class KhinsiderSoundtrackExtractor(AsynchronousExtractor):
         "keyword": "d91cf3edee6713b536eaf3995743f0be7dc72f68",
     })]
     root = "https://downloads.khinsider.com"
+    encoding = "utf-8"
 
     def __init__(self, match):
         AsynchronousExtractor.__init__(self)
@@ -35,7 +36,7 @@ class KhinsiderSoundtrackExtractor(AsynchronousExtractor):
 
     def items(self):
         url = (self.root + "/game-soundtracks/album/" + self.album)
-        page = self.request(url, encoding="utf-8").text
+        page = self.request(url).text
         data = self.get_job_metadata(page)
         yield Message.Version, 1
         yield Message.Directory, data
@@ -63,7 +64,7 @@ class KhinsiderSoundtrackExtractor(AsynchronousExtractor):
         for num, url in enumerate(text.extract_iter(
                 page, '<td class="clickable-row"><a href="', '"'), 1):
             url = text.urljoin(self.root, url)
-            page = self.request(url, encoding="utf-8").text
+            page = self.request(url).text
             url = text.extract(
                 page, '<p><a style="color: #21363f;" href="', '"')[0]
             yield url, text.nameext_from_url(url, {"num": num})
@@ -10,7 +10,7 @@
 
 from .common import ChapterExtractor, MangaExtractor
 from .. import text, cloudflare, aes, exception
-from ..cache import cache
+from ..cache import cache, memcache
 import re
 import hashlib
 import ast
@@ -152,8 +152,14 @@ class KissmangaChapterExtractor(KissmangaBase, ChapterExtractor):
 
     def build_aes_key(self, page):
         chko = self._chko_from_external_script()
+        scripts = tuple(self._scripts(page))
+        return self._derive_aes_key((chko, scripts))
 
-        for script in self._scripts(page):
+    @memcache(keyarg=1)
+    def _derive_aes_key(self, inputs):
+        chko, scripts = inputs
+
+        for script in scripts:
             for stmt in [s.strip() for s in script.split(";")]:
 
                 if stmt.startswith("var _"):
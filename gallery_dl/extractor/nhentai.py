@@ -9,7 +9,7 @@
 """Extract images from https://nhentai.net/"""
 
 from .common import Extractor, Message
-from .. import text
+from .. import text, util
 
 
 class NHentaiExtractor(Extractor):
@@ -77,25 +77,34 @@ class NhentaiSearchExtractor(NHentaiExtractor):
     category = "nhentai"
     subcategory = "search"
     pattern = [r"(?:https?://)?nhentai\.net/search/?\?(.*)"]
+    per_page = 25
 
     def __init__(self, match):
         NHentaiExtractor.__init__(self)
         self.params = text.parse_query(match.group(1))
+        self.params["page"] = text.parse_int(self.params.get("page"), 1)
+        self.start_post = 0
 
         if "q" in self.params:
             self.params["query"] = self.params["q"]
             del self.params["q"]
 
+    def skip_queue(self, num):
+        pages, posts = divmod(num, self.per_page)
+        self.params["page"] += pages
+        self.start_post += posts
+        return num
+
     def items(self):
         yield Message.Version, 1
-        for ginfo in self._pagination("galleries/search", self.params):
+        results = self._pagination("galleries/search", self.params)
+        for ginfo in util.advance(results, self.start_post):
             url = "{}/g/{}/".format(self.root, ginfo["id"])
             yield Message.Queue, url, self.transform_to_metadata(ginfo)
 
     def _pagination(self, endpoint, params):
         """Pagination over API responses"""
         url = "{}/api/{}".format(self.root, endpoint)
-        params["page"] = text.parse_int(params.get("page"), 1)
 
         while True:
             data = self.request(
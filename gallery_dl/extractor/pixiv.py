@@ -26,9 +26,18 @@ class PixivExtractor(Extractor):
         self.api = PixivAppAPI(self)
         self.user_id = -1
         self.load_ugoira = self.config("ugoira", True)
+        self.offset = 0
+
+    def skip(self, num):
+        # the number of files per work is unknown until its API result
+        # has been fetched; skipped works are therefore still listed,
+        # but without any further processing or ugoira metadata requests
+        self.offset += num
+        return num
 
     def items(self):
         metadata = self.get_metadata()
+        offset = self.offset
 
         yield Message.Version, 1
         yield Message.Directory, metadata
@@ -36,6 +45,13 @@ class PixivExtractor(Extractor):
         for work in self.works():
             if not work["user"]["id"]:
                 continue
+            if offset:
+                if work["type"] == "ugoira" and not self.load_ugoira:
+                    continue
+                count = 1 if work["type"] == "ugoira" else work["page_count"]
+                if offset >= count:
+                    offset -= count
+                    continue
 
             meta_single_page = work["meta_single_page"]
             meta_pages = work["meta_pages"]
@@ -63,12 +79,14 @@ class PixivExtractor(Extractor):
                 yield Message.Url, url, work
 
             else:
-                for num, img in enumerate(meta_pages):
-                    url = img["image_urls"]["original"]
+                for num in range(offset, len(meta_pages)):
+                    url = meta_pages[num]["image_urls"]["original"]
                     work["num"] = "_p{:02}".format(num)
                     work["extension"] = url.rpartition(".")[2]
                     yield Message.Url, url, work
 
+            offset = 0
+
     def works(self):
         """Return an iterable containing all relevant 'work'-objects"""
 
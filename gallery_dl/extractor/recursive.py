@@ -10,7 +10,7 @@
 
 import re
 from .common import Extractor, Message
-from .. import extractor, adapter, util
+from .. import extractor, adapter, text, util
 
 
 class RecursiveExtractor(Extractor):
@@ -29,8 +29,13 @@ class RecursiveExtractor(Extractor):
     def items(self):
         blist = self.config(
             "blacklist", {"directlink"} | util.SPECIAL_EXTRACTORS)
-        page = self.request(self.url).text
+        response = self.request(self.url, stream=True)
+        pattern = re.compile(r"https?://[^\s\"']+")
+        # collect all URLs before handling any of them, since the response
+        # must not sit idle while child jobs run
+        urls = [match.group(0)
+                for match in text.finditer_stream(response, pattern)]
         yield Message.Version, 1
         with extractor.blacklist(blist):
-            for match in re.finditer(r"https?://[^\s\"']+", page):
-                yield Message.Queue, match.group(0), {}
+            for url in urls:
+                yield Message.Queue, url, {}
@@ -36,7 +36,7 @@ class RedditExtractor(Extractor):
                 util.SPECIAL_EXTRACTORS, [RedditSubredditExtractor]):
             while True:
                 extra = []
-                for url in self._urls(submissions):
+                for url, data in self._urls(submissions):
                     if url[0] == "#":
                         continue
                     if url[0] == "/":
@@ -46,7 +46,7 @@ class RedditExtractor(Extractor):
                     if match:
                         extra.append(match.group(1))
                     else:
-                        yield Message.Queue, text.unescape(url), {}
+                        yield Message.Queue, text.unescape(url), data
 
                 if not extra or depth == self.max_depth:
                     return
@@ -59,14 +59,27 @@ class RedditExtractor(Extractor):
     def submissions(self):
         """Return an iterable containing all (submission, comments) tuples"""
 
+    def constrain(self, constraints, queue=False):
+        if not queue:
+            return
+        api = self.api
+        for key, op, value in constraints:
+            if key != "created_utc" or not isinstance(value, (int, float)):
+                continue
+            if op in (">", ">=", "=="):
+                api.date_min = max(api.date_min, value)
+            if op in ("<", "<=", "=="):
+                api.date_max = min(api.date_max, value)
+
     def _urls(self, submissions):
         for submission, comments in submissions:
             self._visited.add(submission["id"])
             if not submission["is_self"]:
-                yield submission["url"]
+                yield submission["url"], submission
             strings = [submission["selftext_html"] or ""]
             strings += [c["body_html"] or "" for c in comments]
-            yield from text.extract_iter("".join(strings), ' href="', '"')
+            for url in text.extract_iter("".join(strings), ' href="', '"'):
+                yield url, submission
 
 
 class RedditSubredditExtractor(RedditExtractor):
@@ -174,6 +187,13 @@ class RedditAPI():
             self.client_id = client_id
             self.session.headers["User-Agent"] = user_agent
 
+        date_fmt = extractor.config("date-format", "%Y-%m-%dT%H:%M:%S")
+        self.date_min = self._parse_datetime("date-min", 0, date_fmt)
+        self.date_max = self._parse_datetime(
+            "date-max", 253402210800, date_fmt)
+        self.id_min = self._parse_id("id-min", 0)
+        self.id_max = self._parse_id("id-max", 2147483647)
+
     def submission(self, submission_id):
         """Fetch the (submission, comments)=-tuple for a submission id"""
         endpoint = "/comments/" + submission_id + "/.json"
@@ -249,12 +269,8 @@ class RedditAPI():
         return data
 
     def _pagination(self, endpoint, params, _empty=()):
-        date_fmt = self.extractor.config("date-format", "%Y-%m-%dT%H:%M:%S")
-        date_min = self._parse_datetime("date-min", 0, date_fmt)
-        date_max = self._parse_datetime("date-max", 253402210800, date_fmt)
-
-        id_min = self._parse_id("id-min", 0)
-        id_max = self._parse_id("id-max", 2147483647)
+        date_min, date_max = self.date_min, self.date_max
+        id_min, id_max = self.id_min, self.id_max
 
         while True:
             data = self._call(endpoint, params)["data"]
@@ -63,16 +63,19 @@ class SankakuExtractor(SharedConfigExtractor):
     def get_posts(self):
         """Return an iterable containing all relevant post ids"""
 
-    def get_post_data(self, post_id, extr=text.extract):
+    def get_post_data(self, post_id, extr=text.extract,
+                      extr_info=text.compile_rules((
+                          ("tags"   , "<title>", " | "),
+                          ("vavg"   , "itemprop=ratingValue>", "<"),
+                          ("vcnt"   , "itemprop=reviewCount>", "<"),
+                          (None     , "Posted: <", ""),
+                          ("created", ' title="', '"'),
+                      ))):
         """Extract metadata of a single post"""
         url = self.root + "/post/show/" + post_id
         page = self.request(url, retries=10).text
 
-        tags   , pos = extr(page, "<title>", " | ")
-        vavg   , pos = extr(page, "itemprop=ratingValue>", "<", pos)
-        vcnt   , pos = extr(page, "itemprop=reviewCount>", "<", pos)
-        _      , pos = extr(page, "Posted: <", "", pos)
-        created, pos = extr(page, ' title="', '"', pos)
+        info, pos = extr_info(page)
         rating = extr(page, "<li>Rating: ", "<", pos)[0]
 
         file_url, pos = extr(page, '<li>Original: <a href="', '"', pos)
@@ -87,10 +90,10 @@ class SankakuExtractor(SharedConfigExtractor):
         data = {
             "id": text.parse_int(post_id),
             "md5": file_url.rpartition("/")[2].partition(".")[0],
-            "tags": tags,
-            "vote_average": float(vavg or 0),
-            "vote_count": text.parse_int(vcnt),
-            "created_at": created,
+            "tags": info["tags"],
+            "vote_average": float(info["vavg"] or 0),
+            "vote_count": text.parse_int(info["vcnt"]),
+            "created_at": info["created"],
             "rating": (rating or "?")[0].lower(),
             "file_url": "https:" + text.unescape(file_url),
             "width": text.parse_int(width),
@@ -55,6 +55,11 @@ class SmugmugAlbumExtractor(SmugmugExtractor):
     def __init__(self, match):
         SmugmugExtractor.__init__(self)
         self.album_id = match.group(1)
+        self.offset = 0
+
+    def skip(self, num):
+        self.offset += num
+        return num
 
     def items(self):
         album = self.api.album(self.album_id, "User")
@@ -67,7 +72,8 @@ class SmugmugAlbumExtractor(SmugmugExtractor):
         yield Message.Version, 1
         yield Message.Directory, data
 
-        for image in self.api.album_images(self.album_id, "LargestImage"):
+        for image in self.api.album_images(
+                self.album_id, "LargestImage", self.offset):
             url = self._apply_largest(image)
             data["Image"] = image
             yield Message.Url, url, text.nameext_from_url(url, data)
@@ -127,6 +133,13 @@ class SmugmugPathExtractor(SmugmugExtractor):
     def __init__(self, match):
         SmugmugExtractor.__init__(self)
         self.domain, self.user, self.path = match.groups()
+        self.offset = 0
+
+    def skip_queue(self, num):
+        if self.path:
+            return 0
+        self.offset += num
+        return num
 
     def items(self):
         yield Message.Version, 1
@@ -150,7 +163,7 @@ class SmugmugPathExtractor(SmugmugExtractor):
                 yield Message.Queue, "smugmug:album:" + album_id, node
 
         else:
-            for album in self.api.user_albums(self.user):
+            for album in self.api.user_albums(self.user, None, self.offset):
                 uri = "smugmug:album:" + album["AlbumKey"]
                 yield Message.Queue, uri, album
 
@@ -183,14 +196,16 @@ class SmugmugAPI(oauth.OAuth1API):
     def user(self, username, expands=None):
         return self._expansion("user/" + username, expands)
 
-    def album_images(self, album_id, expands=None):
-        return self._pagination("album/" + album_id + "!images", expands)
+    def album_images(self, album_id, expands=None, offset=0):
+        return self._pagination(
+            "album/" + album_id + "!images", expands, offset)
 
     def node_children(self, node_id, expands=None):
         return self._pagination("node/" + node_id + "!children", expands)
 
-    def user_albums(self, username, expands=None):
-        return self._pagination("user/" + username + "!albums", expands)
+    def user_albums(self, username, expands=None, offset=0):
+        return self._pagination(
+            "user/" + username + "!albums", expands, offset)
 
     def site_user(self, domain):
         return self._call("!siteuser", domain=domain)["Response"]["User"]
@@ -228,9 +243,9 @@ class SmugmugAPI(oauth.OAuth1API):
             raise exception.NotFoundError()
         return result[0]
 
-    def _pagination(self, endpoint, expands=None):
+    def _pagination(self, endpoint, expands=None, offset=0):
         endpoint = self._extend(endpoint, expands)
-        params = {"start": 1, "count": 100}
+        params = {"start": offset + 1, "count": 100}
 
         while True:
             data = self._call(endpoint, params)
@@ -7,10 +7,14 @@
 # published by the Free Software Foundation.
 
 import sys
+import copy
 import time
 import json
 import hashlib
 import logging
+import collections
+import multiprocessing
+import concurrent.futures
 from . import extractor, downloader, postprocessor
 from . import config, util, output, exception
 from .extractor.message import Message
@@ -19,6 +23,7 @@ from .extractor.message import Message
 class Job():
     """Base class for Job-types"""
     ulog = None
+    hashes = None
 
     def __init__(self, url, parent=None):
         self.url = url
@@ -29,10 +34,11 @@ class Job():
             "Using %s for '%s'", self.extractor.__class__.__name__, url)
 
         # url predicates
-        predicates = [util.UniquePredicate()]
+        predicates = [self._unique()]
         image = config.get(("_", "image"), {})
         if "filter" in image:
-            predicates.append(util.FilterPredicate(image["filter"]))
+            predicates.append(image["filter"].func)
+            self._constrain(image, False)
         if "range" in image:
             pred = util.RangePredicate(image["range"])
             if pred.lower > 1 and "filter" not in image:
@@ -44,9 +50,13 @@ class Job():
         predicates = []
         chapter = config.get(("_", "chapter"), {})
         if "filter" in chapter:
-            predicates.append(util.FilterPredicate(chapter["filter"]))
+            predicates.append(chapter["filter"].func)
+            self._constrain(chapter, True)
         if "range" in chapter:
-            predicates.append(util.RangePredicate(chapter["range"]))
+            pred = util.RangePredicate(chapter["range"])
+            if pred.lower > 1 and "filter" not in chapter:
+                pred.index += self.extractor.skip_queue(pred.lower - 1)
+            predicates.append(pred)
         self.pred_queue = util.build_predicate(predicates)
 
         # category transfer
@@ -148,6 +158,20 @@ class Job():
         if self.userkwds:
             kwdict.update(self.userkwds)
 
+    def _constrain(self, options, queue):
+        """Pass constraints of a filter expression on to the extractor"""
+        constraints = options.get("constraints")
+        if constraints and self.extractor.config("filter-pushdown", False):
+            self.extractor.constrain(constraints, queue)
+
+    def _unique(self):
+        """Return a predicate to filter duplicate URLs"""
+        if self.extractor.config("unique", "job") != "batch":
+            return util.UniquePredicate()
+        if Job.hashes is None:
+            Job.hashes = util.HashSet(self.extractor.config("unique-spill"))
+        return util.HashedUniquePredicate(Job.hashes)
+
     def _write_unsupported(self, url):
         if self.ulog:
             self.ulog.info(url)
@@ -155,6 +179,10 @@ class Job():
 
 class DownloadJob(Job):
     """Download images into appropriate directory/filename locations"""
+    executors = None  # thread pools shared by all jobs
+    mover = None      # thread for moving files to other filesystems
+    moves = collections.deque()
+    moves_limit = 4
 
     def __init__(self, url, parent=None):
         Job.__init__(self, url, parent)
@@ -164,10 +192,29 @@ class DownloadJob(Job):
         self.sleep = None
         self.downloaders = {}
         self.postprocessors = None
+        self.executors = None
+        self.pending = collections.deque()
         self.out = output.select()
 
+    def run(self):
+        try:
+            Job.run(self)
+        finally:
+            # clean up even when interrupted, e.g. by Ctrl+C
+            if self.pending:
+                self.cancel_pending()
+            if self.postprocessors:
+                for pp in self.postprocessors:
+                    pp.finalize()
+            if self.archive:
+                self.archive.close()
+                self.archive = None
+
     def handle_url(self, url, keywords, fallback=None):
         """Download the resource specified in 'url'"""
+        if self.pending:
+            self.handle_pending()
+
         # prepare download
         self.pathfmt.set_keywords(keywords)
 
@@ -196,16 +243,145 @@ class DownloadJob(Job):
             self.out.skip(self.pathfmt.path)
             return
 
-        # run post processors
+        self.postprocess(self.pathfmt, keywords)
+
+    def postprocess(self, pathfmt, keywords, start=0):
+        """Run post processors and finish a successful download
+
+        Post processors whose 'mode' has a matching thread pool in
+        'executors' run there on a copy of 'pathfmt'. Others run inline
+        and may return a Future to signal that they continue their work
+        in the background. In both cases, all further steps for this file
+        are deferred until handle_pending() finds that work completed
+        and use a copy of 'pathfmt' and its keywords, since extractors
+        reuse and modify keyword dicts for their next file.
+        The same applies to moving a finished file to another filesystem.
+        """
         if self.postprocessors:
-            for pp in self.postprocessors:
-                pp.run(self.pathfmt)
+            executors = self.executors
+            for index in range(start, len(self.postprocessors)):
+                pp = self.postprocessors[index]
+                if executors and pp.mode in executors:
+                    pathfmt = self._copy_pathfmt(pathfmt)
+                    future = executors[pp.mode].submit(
+                        self._run_postprocessor, pp, pathfmt)
+                else:
+                    future = pp.run(pathfmt)
+                    if not future:
+                        continue
+                    pathfmt = self._copy_pathfmt(pathfmt)
+                self.pending.append(
+                    (future, pathfmt, pathfmt.keywords, index + 1))
+                return
 
         # download succeeded
-        self.pathfmt.finalize()
-        self.out.success(self.pathfmt.path, 0)
+        future = pathfmt.finalize(self._submit_move)
+        if future:
+            # wait for its move to another filesystem
+            pathfmt = self._copy_pathfmt(pathfmt)
+            self.pending.append((future, pathfmt, pathfmt.keywords, None))
+            return
+        self.handle_success(pathfmt, keywords)
+
+    def handle_success(self, pathfmt, keywords):
+        """Report a finished download and add it to the archive"""
+        self.out.success(pathfmt.path, 0)
         if self.archive:
-            self.archive.add(keywords)
+            self.archive.add(keywords, pathfmt)
+        if self.postprocessors:
+            for pp in self.postprocessors:
+                pp.run_after(pathfmt)
+
+    def handle_pending(self, wait=False):
+        """Finish downloads whose post processors have completed
+
+        Files get finished in the order they were downloaded in.
+        """
+        pending = self.pending
+        while pending:
+            future, pathfmt, keywords, index = pending[0]
+            if not wait and not future.done():
+                return
+            pending.popleft()
+            try:
+                future.result()
+            except Exception as exc:
+                if index is None:
+                    self.log.error(
+                        "Unable to move '%s' to '%s': %s: %s",
+                        pathfmt.temppath, pathfmt.realpath,
+                        exc.__class__.__name__, exc)
+                else:
+                    postprocessor.log.error(
+                        "%s: processing '%s' failed: %s: %s",
+                        self.postprocessors[index-1].__class__.__name__,
+                        pathfmt.filename, exc.__class__.__name__, exc)
+                self._report_unfinished(pathfmt)
+            else:
+                if index is None:
+                    self.handle_success(pathfmt, keywords)
+                else:
+                    self.postprocess(pathfmt, keywords, index)
+
+    def cancel_pending(self):
+        """Stop all pending work after the job got interrupted
+
+        Background work that did not start yet gets cancelled and running
+        work gets waited for. Files whose moves completed get finished as
+        usual, all others are reported as unfinished.
+        """
+        pending, self.pending = self.pending, collections.deque()
+        for future, _, _, _ in pending:
+            future.cancel()
+        concurrent.futures.wait([future for future, _, _, _ in pending])
+
+        for future, pathfmt, keywords, index in pending:
+            if index is None and not future.cancelled() and \
+                    not future.exception():
+                self.handle_success(pathfmt, keywords)
+            else:
+                self._report_unfinished(pathfmt)
+
+    def _report_unfinished(self, pathfmt):
+        """Log where the data of a file remains that was not finished"""
+        self.log.warning(
+            "'%s' was not finished; its data remains at '%s'",
+            pathfmt.filename, pathfmt.temppath)
+
+    @staticmethod
+    def _copy_pathfmt(pathfmt):
+        """Return a copy of 'pathfmt' with its own 'keywords' dict"""
+        pathfmt = copy.copy(pathfmt)
+        pathfmt.keywords = pathfmt.keywords.copy()
+        return pathfmt
+
+    @staticmethod
+    def _submit_move(func, *args):
+        """Move a file to another filesystem in the background
+
+        Blocks while more than 'moves_limit' moves are outstanding.
+        """
+        if DownloadJob.mover is None:
+            DownloadJob.mover = concurrent.futures.ThreadPoolExecutor(1)
+        moves = DownloadJob.moves
+        while moves and moves[0].done():
+            moves.popleft()
+        while len(moves) >= DownloadJob.moves_limit:
+            concurrent.futures.wait((moves.popleft(),))
+        future = DownloadJob.mover.submit(func, *args)
+        moves.append(future)
+        return future
+
+    @staticmethod
+    def _run_postprocessor(pp, pathfmt):
+        """Run 'pp' in a worker thread and wait for its results"""
+        if pp.threadsafe:
+            future = pp.run(pathfmt)
+        else:
+            with pp.lock:
+                future = pp.run(pathfmt)
+        if future:
+            future.result()
 
     def handle_urllist(self, urls, keywords):
         """Download the resource specified in 'url'"""
@@ -250,16 +426,34 @@ class DownloadJob(Job):
                 else:
                     self.postprocessors.append(pp_obj)
 
+            workers = self.extractor.config("postprocessor-workers")
+            if workers:
+                self.executors = self._executors(workers)
+
+    @staticmethod
+    def _executors(workers):
+        """Return thread pools for background post processors"""
+        if DownloadJob.executors is None:
+            if workers is True:
+                workers = multiprocessing.cpu_count()
+            DownloadJob.executors = {
+                "cpu": concurrent.futures.ThreadPoolExecutor(workers),
+                "io" : concurrent.futures.ThreadPoolExecutor(workers * 5),
+            }
+        return DownloadJob.executors
+
     def handle_queue(self, url, keywords):
+        if self.archive:
+            # let the child job's archive see all entries added so far
+            self.archive.flush()
         try:
             self.__class__(url, self).run()
         except exception.NoExtractorError:
             self._write_unsupported(url)
 
     def handle_finalize(self):
-        if self.postprocessors:
-            for pp in self.postprocessors:
-                pp.finalize()
+        if self.pending:
+            self.handle_pending(True)
 
     def get_downloader(self, url):
         """Return, and possibly construct, a downloader suitable for 'url'"""
@@ -271,6 +465,9 @@ class DownloadJob(Job):
         if instance is None:
             klass = downloader.find(scheme)
             instance = klass(self.extractor.session, self.out)
+            if self.archive and not instance.hashes:
+                # compute a digest for the archive's 'hash' column
+                instance.hashes = ("sha256",)
             self.downloaders[scheme] = instance
         return instance
 
@@ -377,6 +574,7 @@ class TestJob(DownloadJob):
             self.hashobj = hashobj
             self.path = ""
             self.size = 0
+            self.keywords = {}
             self.has_extension = True
 
         def __enter__(self):
@@ -251,6 +251,30 @@ def build_parser():
               "and other delegated URLs"),
     )
 
+    archive = parser.add_argument_group("Archive Options")
+    archive.add_argument(
+        "--archive-stats",
+        metavar="FILE", dest="archive_stats",
+        help=("Print the number of files and bytes per category "
+              "recorded in the download archive FILE"),
+    )
+    archive.add_argument(
+        "--archive-export",
+        metavar="FILE", dest="archive_export",
+        help="Print all entries of the download archive FILE as JSON",
+    )
+    archive.add_argument(
+        "--archive-category",
+        metavar="CATEGORY", dest="archive_category",
+        help="Only consider archive entries of the given category",
+    )
+    archive.add_argument(
+        "--archive-since",
+        metavar="DATE", dest="archive_since",
+        help=("Only consider archive entries added since DATE "
+              "('YYYY-MM-DD') or within the last N days ('Nd')"),
+    )
+
     postprocessor = parser.add_argument_group("Post-processing Options")
     postprocessor.add_argument(
         "--zip",
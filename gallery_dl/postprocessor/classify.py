@@ -38,7 +38,7 @@ class ClassifyPP(PostProcessor):
         if ext in self.mapping:
             path = pathfmt.realdirectory + os.sep + self.mapping[ext]
             pathfmt.realpath = path + os.sep + pathfmt.filename
-            os.makedirs(path, exist_ok=True)
+            pathfmt.create_directory(path)
 
 
 __postprocessor__ = ClassifyPP
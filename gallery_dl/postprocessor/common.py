@@ -9,14 +9,61 @@
 """Common classes and constants used by postprocessor modules."""
 
 from . import log
+import concurrent.futures
+import multiprocessing
+import collections
+import threading
 
 
 class PostProcessor():
     """Base class for postprocessors"""
     log = log
 
+    # where run() gets called with 'postprocessor-workers' enabled:
+    # "inline" - on the download thread
+    # "io"     - in a thread pool for I/O-bound work
+    # "cpu"    - in a thread pool with one thread per CPU core
+    mode = "inline"
+
+    # True if run() may be called from several threads at the same time
+    threadsafe = False
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pool = None
+
     def run(self, pathfmt):
         """Execute the postprocessor for a file"""
 
+    def run_after(self, pathfmt):
+        """Called after a file has been moved to its final location"""
+
     def finalize(self):
         """Cleanup"""
+
+    def pool_enable(self, workers):
+        """Set up a private thread pool with 'workers' threads for submit()
+
+        run() is then supposed to return the Futures of submit() calls
+        and gets itself called on the download thread.
+        """
+        if workers is True:
+            workers = multiprocessing.cpu_count()
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers)
+        self.queue = collections.deque()
+        self.limit = workers * 2
+        self.mode = "inline"
+
+    def submit(self, func, *args):
+        """Call 'func' in the background and return a Future
+
+        Blocks while more than 'limit' calls are outstanding.
+        """
+        queue = self.queue
+        while queue and queue[0].done():
+            queue.popleft()
+        while len(queue) >= self.limit:
+            concurrent.futures.wait((queue.popleft(),))
+        future = self.pool.submit(func, *args)
+        queue.append(future)
+        return future
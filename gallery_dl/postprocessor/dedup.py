@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2018 Mike Fährmann
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+
+"""Replace duplicate files with links to already existing copies"""
+
+from .common import PostProcessor
+from .. import util
+import concurrent.futures
+import multiprocessing
+import hashlib
+import sqlite3
+import mmap
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class DedupPP(PostProcessor):
+    mode = "cpu"
+    seeded = set()  # (database, directory) pairs scanned by this process
+
+    # ioctl request code to share the data blocks of two files on Linux
+    FICLONE = 0x40049409
+
+    def __init__(self, pathfmt, options):
+        PostProcessor.__init__(self)
+        self.algorithm = options.get("algorithm", "sha256")
+        hashlib.new(self.algorithm)
+
+        self.link = options.get("link", "hardlink")
+        if self.link == "reflink" and not fcntl:
+            raise ValueError("'reflink' is not supported on this platform")
+
+        path = options.get("database")
+        if path:
+            path = util.expand_path(path)
+        else:
+            path = os.path.join(pathfmt.basedirectory, ".dedup.sqlite3")
+        self.database = path
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS files ("
+                        "path TEXT PRIMARY KEY, hash TEXT, "
+                        "size INTEGER, mtime INTEGER)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS files_hash "
+                        "ON files (hash)")
+        self.pending = 0
+
+        seed = options.get("seed")
+        if seed:
+            if isinstance(seed, str):
+                seed = (seed,)
+            self.seed(seed, options.get("threads", True))
+
+    def run(self, pathfmt):
+        if pathfmt.delete:
+            return
+
+        hashes = pathfmt.keywords.get("_hashes")
+        digest = hashes.get(self.algorithm) if hashes else None
+        if not digest:
+            digest = hash_file(pathfmt.temppath, self.algorithm)
+        size = os.stat(pathfmt.temppath).st_size
+
+        original = self._find(digest, size, pathfmt.realpath)
+        if original:
+            try:
+                self._link(original, pathfmt.realpath)
+            except OSError as exc:
+                self.log.warning(
+                    "Unable to %s '%s' to '%s': %s",
+                    self.link, pathfmt.realpath, original, exc)
+            else:
+                self.log.debug(
+                    "Replaced '%s' with a %s to '%s'",
+                    pathfmt.filename, self.link, original)
+                if pathfmt.temppath != pathfmt.realpath:
+                    pathfmt.delete = True
+                return
+
+        self._insert(pathfmt.realpath, digest, size, None)
+
+    def finalize(self):
+        self.db.commit()
+        self.db.close()
+
+    def seed(self, directories, threads=True):
+        """Add all files in 'directories' to the index
+
+        Files already in the index with unchanged size and mtime
+        get skipped. All others are hashed by 'threads' threads.
+        Each directory gets scanned only once per process and database,
+        not again for the post processors of every child job.
+        """
+        directories = [
+            directory for directory in map(util.expand_path, directories)
+            if (self.database, directory) not in self.seeded
+        ]
+        if not directories:
+            return
+        self.seeded.update(
+            (self.database, directory) for directory in directories)
+
+        known = {
+            path: (size, mtime)
+            for path, size, mtime in self.db.execute(
+                "SELECT path, size, mtime FROM files")
+        }
+        files = []
+        for directory in directories:
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    path = os.path.join(root, name)
+                    if path.endswith(".part") or \
+                            path.startswith(self.database):
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    size, mtime = stat.st_size, int(stat.st_mtime)
+                    info = known.get(path)
+                    if not info or info[0] != size or \
+                            info[1] is not None and info[1] != mtime:
+                        files.append((path, (size, mtime)))
+
+        if not files:
+            return
+        self.log.info("Hashing %d files", len(files))
+
+        if threads is True:
+            threads = multiprocessing.cpu_count()
+        with concurrent.futures.ThreadPoolExecutor(threads or 1) as pool:
+            digests = pool.map(
+                hash_file, [path for path, _ in files],
+                [self.algorithm] * len(files))
+            for (path, (size, mtime)), digest in zip(files, digests):
+                self._insert(path, digest, size, mtime)
+        self.db.commit()
+
+    def _find(self, digest, size, exclude):
+        """Return the path of an existing file with the same content"""
+        rows = self.db.execute(
+            "SELECT path, size FROM files WHERE hash=?", (digest,)).fetchall()
+        for path, size_db in rows:
+            if path == exclude:
+                continue
+            try:
+                if os.stat(path).st_size == size == size_db:
+                    return path
+            except OSError:
+                pass
+            self.db.execute("DELETE FROM files WHERE path=?", (path,))
+        return None
+
+    def _insert(self, path, digest, size, mtime):
+        self.db.execute(
+            "INSERT OR REPLACE INTO files (path, hash, size, mtime) "
+            "VALUES (?, ?, ?, ?)", (path, digest, size, mtime))
+        self.pending += 1
+        if self.pending >= 100:
+            self.db.commit()
+            self.pending = 0
+
+    def _link(self, src, dst):
+        """Create 'dst' as hardlink or reflink to 'src'"""
+        temp = dst + ".dedup"
+        if self.link == "reflink":
+            with open(src, "rb") as fsrc, open(temp, "wb") as fdst:
+                try:
+                    fcntl.ioctl(fdst.fileno(), self.FICLONE, fsrc.fileno())
+                except OSError:
+                    fdst.close()
+                    os.unlink(temp)
+                    raise
+        else:
+            os.link(src, temp)
+        os.replace(temp, dst)
+
+
+def hash_file(path, algorithm="sha256"):
+    """Return the hex digest of the file at 'path'"""
+    hashobj = hashlib.new(algorithm)
+    with open(path, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                hashobj.update(data)
+    return hashobj.hexdigest()
+
+
+__postprocessor__ = DedupPP
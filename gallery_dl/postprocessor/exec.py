@@ -9,25 +9,111 @@
 """Execute processes"""
 
 from .common import PostProcessor
+import multiprocessing
 import subprocess
+import threading
 
 
 class ExecPP(PostProcessor):
+    mode = "io"
+    threadsafe = True
 
     def __init__(self, pathfmt, options):
         PostProcessor.__init__(self)
         self.args = options["command"]
-        if options.get("async", False):
-            self._exec = subprocess.Popen
+
+        limit = options.get("async", False)
+        if limit:
+            if limit is True:
+                limit = multiprocessing.cpu_count()
+            self.limit = limit
+            self.processes = []
+            self._exec = self._exec_async
+            self.threadsafe = False
+
+        self.batch = options.get("batch")
+        if self.batch:
+            self.timeout = options.get("batch-timeout")
+            self.timer = None
+            self.files = []
+            # files get collected in run_after() on the download thread
+            self.mode = "inline"
 
     def run(self, pathfmt):
-        self._exec([
-            arg.format_map(pathfmt.keywords)
-            for arg in self.args
-        ])
+        if not self.batch:
+            self._exec([
+                arg.format_map(pathfmt.keywords)
+                for arg in self.args
+            ])
+
+    def run_after(self, pathfmt):
+        if not self.batch:
+            return
+        with self.lock:
+            files = self.files
+            files.append((pathfmt.realpath, dict(pathfmt.keywords)))
+            if len(files) >= self.batch:
+                self._exec_batch()
+            elif len(files) == 1 and self.timeout:
+                self.timer = threading.Timer(self.timeout, self._exec_timeout)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def finalize(self):
+        if self.batch:
+            with self.lock:
+                if self.files:
+                    self._exec_batch()
+        if self._exec == self._exec_async:
+            self._reap(0)
+
+    def _exec_timeout(self):
+        """Run the command for an incomplete batch from a timer thread"""
+        with self.lock:
+            if self.files and self.timer is threading.current_thread():
+                self._exec_batch()
+
+    def _exec_batch(self):
+        """Run the command for all collected files"""
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        files = self.files
+        paths = [path for path, _ in files]
+        kwdict = files[0][1]
+        del files[:]
+
+        args = []
+        for arg in self.args:
+            if arg == "{}":
+                args.extend(paths)
+            else:
+                args.append(arg.format_map(kwdict))
+        if "{}" not in self.args:
+            args.extend(paths)
+        self._exec(args)
 
     def _exec(self, args):
-        retcode = subprocess.Popen(args).wait()
+        self._check(subprocess.Popen(args).wait(), args)
+
+    def _exec_async(self, args):
+        self._reap(self.limit - 1)
+        self.processes.append((subprocess.Popen(args), args))
+
+    def _reap(self, limit):
+        """Wait until no more than 'limit' child processes are running"""
+        running = []
+        for process, args in self.processes:
+            if process.poll() is None:
+                running.append((process, args))
+            else:
+                self._check(process.returncode, args)
+        while len(running) > limit:
+            process, args = running.pop(0)
+            self._check(process.wait(), args)
+        self.processes = running
+
+    def _check(self, retcode, args):
         if retcode:
             self.log.warning(
                 "executing '%s' returned non-zero exit status %d",
@@ -17,64 +17,156 @@ import os
 
 
 class UgoiraPP(PostProcessor):
+    mode = "cpu"
+    threadsafe = True
+
+    # frame formats and their decoders for ffmpeg's image2pipe demuxer
+    CODECS = {"jpg": "mjpeg", "jpeg": "mjpeg", "png": "png", "gif": "gif"}
+
+    # maximum factor by which repeating frames to get a constant frame rate
+    # may increase the total number of frames sent to ffmpeg
+    REPEAT_LIMIT = 4
 
     def __init__(self, pathfmt, options):
         PostProcessor.__init__(self)
         self.extension = options.get("extension") or "webm"
         self.args = options.get("ffmpeg-args")
         self.twopass = options.get("ffmpeg-twopass")
+        self.demuxer = options.get("ffmpeg-demuxer") or "auto"
         self.delete = not options.get("keep-files", False)
 
         ffmpeg = options.get("ffmpeg-location")
         self.ffmpeg = util.expand_path(ffmpeg) if ffmpeg else "ffmpeg"
 
+        # use a memory-backed filesystem for extracted frames if possible
+        shm = "/dev/shm"
+        self.tempdir = shm if os.access(shm, os.W_OK | os.X_OK) else None
+
+        processes = options.get("processes")
+        if processes:
+            self.pool_enable(processes)
+
     def run(self, pathfmt):
         if (pathfmt.keywords["extension"] != "zip" or
                 "frames" not in pathfmt.keywords):
             return
 
+        frames = pathfmt.keywords["frames"]
+        zippath = pathfmt.temppath
+        pathfmt.set_extension(self.extension)
+        outpath = pathfmt.realpath
+
+        if self.delete:
+            pathfmt.delete = True
+        else:
+            pathfmt.set_extension("zip")
+
+        if self.pool:
+            return self.submit(self.convert, zippath, outpath, frames)
+        self.convert(zippath, outpath, frames)
+
+    def finalize(self):
+        if self.pool:
+            self.pool.shutdown()
+
+    def convert(self, zippath, outpath, frames):
+        """Convert the frames in 'zippath' to a video file at 'outpath'"""
+        pipe = self.demuxer != "concat" and self._frame_rate(frames)
+        with tempfile.TemporaryDirectory(dir=self.tempdir) as tempdir:
+            if pipe:
+                self._image2pipe(zippath, outpath, frames, tempdir, *pipe)
+            else:
+                self._concat(zippath, outpath, frames, tempdir)
+
+    def _concat(self, zippath, outpath, frames, tempdir):
+        """Extract all frames and use ffmpeg's concat demuxer"""
         framelist = [
             (frame["file"], frame["delay"] / 1000)
-            for frame in pathfmt.keywords["frames"]
+            for frame in frames
         ]
         if self.extension != "gif":
             # repeat the last frame to prevent it from only being
             # displayed for a very short amount of time
             framelist.append(framelist[-1])
 
-        with tempfile.TemporaryDirectory() as tempdir:
-            # extract frames
-            with zipfile.ZipFile(pathfmt.temppath) as zfile:
-                zfile.extractall(tempdir)
-
-            # write ffconcat file
-            ffconcat = tempdir + "/ffconcat.txt"
-            with open(ffconcat, "w") as file:
-                file.write("ffconcat version 1.0\n")
-                for name, duration in framelist:
-                    file.write("file '{}'\n".format(name))
-                    file.write("duration {}\n".format(duration))
-
-            # invoke ffmpeg
-            pathfmt.set_extension(self.extension)
-            args = [self.ffmpeg, "-i", ffconcat]
-            if self.args:
-                args += self.args
-            if self.twopass:
-                if "-f" not in args:
-                    args += ["-f", self.extension]
-                null = "NUL" if os.name == "nt" else "/dev/null"
-                args += ["-passlogfile", tempdir + "/ffmpeg2pass", "-pass"]
-                subprocess.Popen(args + ["1", "-y", null]).wait()
-                subprocess.Popen(args + ["2", pathfmt.realpath]).wait()
-            else:
-                args.append(pathfmt.realpath)
-                subprocess.Popen(args).wait()
+        # extract frames
+        with zipfile.ZipFile(zippath) as zfile:
+            zfile.extractall(tempdir)
 
-        if self.delete:
-            pathfmt.delete = True
+        # write ffconcat file
+        ffconcat = tempdir + "/ffconcat.txt"
+        with open(ffconcat, "w") as file:
+            file.write("ffconcat version 1.0\n")
+            for name, duration in framelist:
+                file.write("file '{}'\n".format(name))
+                file.write("duration {}\n".format(duration))
+
+        self._exec([self.ffmpeg, "-i", ffconcat], outpath, tempdir)
+
+    def _image2pipe(self, zippath, outpath, frames, tempdir, rate, counts):
+        """Pipe frames directly from the ZIP archive into ffmpeg"""
+        with zipfile.ZipFile(zippath) as zfile:
+            data = [zfile.read(frame["file"]) for frame in frames]
+
+        def write(stdin):
+            for frame, count in zip(data, counts):
+                for _ in range(count):
+                    stdin.write(frame)
+
+        args = [self.ffmpeg, "-f", "image2pipe", "-framerate", rate]
+        ext = frames[0]["file"].rpartition(".")[2].lower()
+        if ext in self.CODECS:
+            args += ["-c:v", self.CODECS[ext]]
+        args += ["-i", "-"]
+        self._exec(args, outpath, tempdir, write)
+
+    def _exec(self, args, outpath, tempdir, write=None):
+        """Run ffmpeg, possibly in two passes"""
+        if self.args:
+            args += self.args
+        if self.twopass:
+            if "-f" not in args[args.index("-i"):]:
+                args += ["-f", self.extension]
+            null = "NUL" if os.name == "nt" else "/dev/null"
+            args += ["-passlogfile", tempdir + "/ffmpeg2pass", "-pass"]
+            self._popen(args + ["1", "-y", null], write)
+            self._popen(args + ["2", outpath], write)
         else:
-            pathfmt.set_extension("zip")
+            args.append(outpath)
+            self._popen(args, write)
+
+    def _popen(self, args, write):
+        if not write:
+            return subprocess.Popen(args).wait()
+        process = subprocess.Popen(args, stdin=subprocess.PIPE)
+        try:
+            write(process.stdin)
+            process.stdin.close()
+        except BrokenPipeError:
+            self.log.warning("ffmpeg exited before receiving all frames")
+        return process.wait()
+
+    def _frame_rate(self, frames):
+        """Return a constant frame rate and per-frame repeat counts
+
+        Returns None if the frame delays would require too many repeated
+        frames to be represented by a constant frame rate.
+        """
+        delays = [int(frame["delay"]) for frame in frames]
+        if not delays:
+            return None
+
+        gcd = 0
+        for delay in delays:
+            while delay:
+                gcd, delay = delay, gcd % delay
+        if not gcd:
+            return None
+
+        counts = [delay // gcd for delay in delays]
+        if sum(counts) > len(counts) * self.REPEAT_LIMIT:
+            return None
+        return "1000/{}".format(gcd), counts
 
 
 __postprocessor__ = UgoiraPP
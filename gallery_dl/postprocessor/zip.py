@@ -9,11 +9,18 @@
 """Store files in ZIP archives"""
 
 from .common import PostProcessor
+import collections
+import threading
+import warnings
 import zipfile
+import shutil
+import time
+import sys
 import os
 
 
 class ZipPP(PostProcessor):
+    mode = "io"
 
     COMPRESSION_ALGORITHMS = {
         "store": zipfile.ZIP_STORED,
@@ -32,28 +39,250 @@ class ZipPP(PostProcessor):
                 "unknown compression algorithm '%s'; falling back to 'store'",
                 algorithm)
             algorithm = "store"
+        if algorithm != "store":
+            self.mode = "cpu"
+        self.compression = self.COMPRESSION_ALGORITHMS[algorithm]
 
-        self.path = pathfmt.realdirectory
-        self.zfile = zipfile.ZipFile(
-            self.path + self.ext, "a",
-            self.COMPRESSION_ALGORITHMS[algorithm], True)
+        self.archives = collections.OrderedDict()
+        self.locks = {}
+        self.directories = set()
+        self.queued = set()
+        self.max_open = options.get("max-open", 8)
+        self.stream = False
+        self.entry = None
+
+        if options.get("mode") == "stream":
+            if sys.version_info < (3, 6):
+                # ZipFile.open() supports writing only since Python 3.6
+                raise ValueError("'stream' mode is not supported "
+                                 "by this Python version (3.6+ required)")
+            if not self.delete:
+                self.log.warning("'keep-files' is not supported in 'stream' "
+                                 "mode; falling back to 'default'")
+            else:
+                self._stream_enable(pathfmt)
+
+        threads = options.get("threads")
+        if threads and algorithm != "store" and not self.stream:
+            self.pool_enable(threads)
 
     def run(self, pathfmt):
+        if self.entry:
+            entry, self.entry = self.entry, None
+            entry.close()
+            if entry.info.filename != pathfmt.filename:
+                # the filename changed after opening this entry
+                self._fixup(entry, pathfmt.filename)
+            pathfmt.delete = True
+            return
+
+        directory = pathfmt.realdirectory
+        name = pathfmt.filename
+
+        if self.pool:
+            # the lock protects 'archives' and 'queued' from worker threads
+            with self.lock:
+                zfile = self._archive(directory)
+                if name in zfile.NameToInfo or \
+                        (directory, name) in self.queued:
+                    return
+                self.queued.add((directory, name))
+            pathfmt.delete = self.delete
+            return self.submit(
+                self._compress, directory, pathfmt.temppath, name)
+
         # 'NameToInfo' is not officially documented, but it's available
         # for all supported Python versions and using it directly is a lot
         # better than calling getinfo()
-        if pathfmt.filename not in self.zfile.NameToInfo:
-            self.zfile.write(pathfmt.temppath, pathfmt.filename)
+        zfile = self._archive(directory)
+        if name not in zfile.NameToInfo:
+            zfile.write(pathfmt.temppath, name)
             pathfmt.delete = self.delete
 
     def finalize(self):
-        self.zfile.close()
+        if self.pool:
+            self.pool.shutdown()
+        if self.entry:
+            self._discard()
+
+        archives = self.archives
+        while archives:
+            self._close(*archives.popitem(False))
 
         if self.delete:
-            try:
-                os.rmdir(self.path)
-            except OSError:
-                pass
+            for directory in self.directories:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+
+    def _archive(self, directory):
+        """Return the open ZIP archive for files in 'directory'
+
+        Keeps up to 'max_open' archives open and closes the least
+        recently used one to make room for another.
+        """
+        archives = self.archives
+        try:
+            zfile = archives.pop(directory)
+        except KeyError:
+            if len(archives) >= self.max_open:
+                self._close(*archives.popitem(False))
+            path = directory + self.ext
+            if self.stream:
+                # write new entries into a staging archive ('<name>.part'),
+                # which replaces the actual archive in _close()
+                stage = path + ".part"
+                if os.path.exists(path):
+                    os.replace(path, stage)
+                path = stage
+            zfile = zipfile.ZipFile(path, "a", self.compression, True)
+            self.directories.add(directory)
+            if self.pool:
+                self.locks[directory] = threading.Lock()
+        archives[directory] = zfile
+        return zfile
+
+    def _close(self, directory, zfile):
+        """Close an archive and move it to its final location"""
+        lock = self.locks.get(directory)
+        if lock:
+            # wait for a worker thread still writing to it
+            with lock:
+                zfile.close()
+                del self.locks[directory]
+        else:
+            zfile.close()
+        if self.stream:
+            path = directory + self.ext
+            fixups = self.fixups.pop(directory, None)
+            if fixups:
+                self._rewrite(path + ".part", fixups)
+            os.replace(path + ".part", path)
+
+    def _compress(self, directory, path, name):
+        """Compress a file in a worker thread and add it to an archive
+
+        Only one thread at a time can write to an archive, but files for
+        different archives get compressed in parallel.
+        """
+        try:
+            while True:
+                with self.lock:
+                    zfile = self._archive(directory)
+                    lock = self.locks[directory]
+                with lock:
+                    # make sure 'zfile' didn't get closed in the meantime
+                    if self.locks.get(directory) is lock:
+                        zfile.write(path, name)
+                        return
+        finally:
+            with self.lock:
+                self.queued.discard((directory, name))
+
+    def _stream_enable(self, pathfmt):
+        """Let downloaders write directly into archives"""
+        self.stream = True
+        self.mode = "inline"
+        self.fixups = {}
+        self.pathfmt = pathfmt
+        self._open_file = pathfmt.open
+        pathfmt.open = self._open
+
+    def _open(self, mode="wb"):
+        """Open an archive entry for the current file as file object"""
+        if self.entry:
+            # a previous download attempt failed
+            self._discard()
+
+        pathfmt = self.pathfmt
+        directory = pathfmt.realdirectory
+        zfile = self._archive(directory)
+        if mode == "r+b" or self._contains(directory, zfile, pathfmt.filename):
+            # resume a .part file or skip duplicates the usual way
+            return self._open_file(mode)
+
+        self.entry = ZipEntry(zfile, directory, pathfmt.filename)
+        return self.entry
+
+    def _contains(self, directory, zfile, name):
+        """Return True if 'zfile' has a (not discarded) member 'name'"""
+        info = zfile.NameToInfo.get(name)
+        if not info:
+            return False
+        fixups = self.fixups.get(directory)
+        return not fixups or fixups.get(info.header_offset, name) is not None
+
+    def _discard(self):
+        """Remove the current entry from its archive"""
+        entry, self.entry = self.entry, None
+        entry.close()
+        self._fixup(entry, None)
+
+    def _fixup(self, entry, name):
+        """Rename or, for 'name' None, remove 'entry' when closing its archive
+
+        Already written members can't be modified with the public
+        zipfile API, so the archive gets rewritten in _rewrite().
+        """
+        self.fixups.setdefault(entry.directory, {})[
+            entry.info.header_offset] = name
+
+    @staticmethod
+    def _rewrite(path, fixups):
+        """Copy the archive at 'path' while applying 'fixups'"""
+        temp = path + ".tmp"
+        with zipfile.ZipFile(path) as zin, \
+                zipfile.ZipFile(temp, "w", allowZip64=True) as zout:
+            for info in zin.infolist():
+                name = fixups.get(info.header_offset, info.filename)
+                if name is None:
+                    continue
+                copy = zipfile.ZipInfo(name, info.date_time)
+                copy.compress_type = info.compress_type
+                copy.external_attr = info.external_attr
+                with zin.open(info) as src, \
+                        zout.open(copy, "w", force_zip64=True) as dst:
+                    shutil.copyfileobj(src, dst)
+        os.replace(temp, path)
+
+
+class ZipEntry():
+    """Write-only file object for a single entry in a ZIP archive
+
+    Data gets written directly into the archive with the public
+    ZipFile.open() API and the entry becomes one of its members on
+    close(). Removing or renaming it afterwards is up to ZipPP.
+    """
+
+    def __init__(self, zfile, directory, name):
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = zfile.compression
+        info.external_attr = 0o644 << 16
+        with warnings.catch_warnings():
+            # the name of a discarded entry may already be in use
+            warnings.simplefilter("ignore", UserWarning)
+            self.file = zfile.open(info, "w", force_zip64=True)
+        self.info = info
+        self.directory = directory
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return self.file.write(data)
+
+    def tell(self):
+        return self.size
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # ZipPP closes the entry after the download has been verified
+        pass
 
 
 __postprocessor__ = ZipPP
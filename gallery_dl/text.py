@@ -10,6 +10,8 @@
 
 import re
 import html
+import codecs
+import itertools
 import os.path
 import urllib.parse
 
@@ -35,19 +37,23 @@ def clean_xml(xmldata, repl=""):
     return xmldata
 
 
-def remove_html(txt):
+HTML_TAG = re.compile("<[^>]+>")
+WINDOWS_ILLEGAL = re.compile(r'[<>:"\\/|?*]')
+
+
+def remove_html(txt, sub=HTML_TAG.sub):
     """Remove html-tags from a string"""
     try:
-        return " ".join(re.sub("<[^>]+>", " ", txt).split())
+        return " ".join(sub(" ", txt).split())
     except TypeError:
         return ""
 
 
-def split_html(txt, sep=None):
+def split_html(txt, sep=None, split=HTML_TAG.split):
     """Split input string by html-tags"""
     try:
         return [
-            x for x in re.split("<[^>]+>", txt)
+            x for x in split(txt)
             if x and not x.isspace()
         ]
     except TypeError:
@@ -75,7 +81,7 @@ def nameext_from_url(url, data=None):
 def clean_path_windows(path):
     """Remove illegal characters from a path-segment (Windows)"""
     try:
-        return re.sub(r'[<>:"\\/|?*]', "_", path)
+        return WINDOWS_ILLEGAL.sub("_", path)
     except TypeError:
         return ""
 
@@ -127,6 +133,52 @@ def extract_all(txt, rules, pos=0, values=None):
     return values, pos
 
 
+def compile_rules(rules):
+    """Compile extract_all() 'rules' into a function
+
+    The returned function takes the same 'txt', 'pos' and 'values'
+    arguments as extract_all() and returns the same result, but performs
+    all searches inline, without a call and a tuple per rule.
+
+    Example:
+        extr = compile_rules((("a", "<a>", "</a>"), ("b", "<b>", "</b>")))
+        extr("<a>1</a><b>2</b>") -> {"a": "1", "b": "2"}, 16
+    """
+    keys = []
+    lines = [
+        "def extract_rules(txt, pos=0, values=None):",
+        "    if values is None:",
+        "        values = {}",
+        "    if not isinstance(txt, str):",
+        "        values.update(NONE)",
+        "        return values, pos",
+        "    index = txt.index",
+    ]
+    for key, begin, end in rules:
+        if not isinstance(begin, str) or not isinstance(end, str):
+            raise TypeError("'begin' and 'end' must be strings")
+        if key:
+            keys.append(key)
+        lines.extend((
+            "    try:",
+            "        first = index({!r}, pos) + {}".format(begin, len(begin)),
+            "        last = index({!r}, first)".format(end),
+        ))
+        if key:
+            lines.append("        values[{!r}] = txt[first:last]".format(key))
+        lines.append("        pos = last + {}".format(len(end)))
+        lines.append("    except ValueError:")
+        if key:
+            lines.append("        values[{!r}] = None".format(key))
+        else:
+            lines.append("        pass")
+    lines.append("    return values, pos")
+
+    namespace = {"NONE": dict.fromkeys(keys)}
+    exec("\n".join(lines), namespace)
+    return namespace["extract_rules"]
+
+
 def extract_iter(txt, begin, end, pos=0):
     """Yield all values obtained by repeated calls to text.extract"""
     while True:
@@ -136,6 +188,69 @@ def extract_iter(txt, begin, end, pos=0):
         yield value
 
 
+def iter_stream(response, chunk_size=16384):
+    """Yield the content of a streamed response as decoded text chunks"""
+    decoder = codecs.getincrementaldecoder(
+        response.encoding or "utf-8")("replace")
+    for chunk in response.iter_content(chunk_size):
+        data = decoder.decode(chunk)
+        if data:
+            yield data
+    data = decoder.decode(b"", True)
+    if data:
+        yield data
+
+
+def extract_iter_stream(response, begin, end, chunk_size=16384):
+    """Yield all values between 'begin' and 'end' in a streamed response
+
+    Works like extract_iter() on the response's text, but scans it
+    chunk by chunk while it is being downloaded and only keeps
+    the part after the last match in memory.
+    """
+    buf = ""
+    for data in iter_stream(response, chunk_size):
+        buf += data
+        pos = 0
+        while True:
+            first = buf.find(begin, pos)
+            if first < 0:
+                # keep enough characters for a 'begin' split between chunks
+                pos = max(pos, len(buf) - len(begin) + 1)
+                break
+            last = buf.find(end, first + len(begin))
+            if last < 0:
+                pos = first
+                break
+            yield buf[first + len(begin):last]
+            pos = last + len(end)
+        buf = buf[pos:]
+
+
+def finditer_stream(response, pattern, overlap=256, chunk_size=16384):
+    """Yield match objects for a compiled 'pattern' in a streamed response
+
+    Matches reaching the end of the data received so far are deferred
+    until more data has arrived. 'overlap' characters after the last
+    match are kept to find matches split between chunks, so 'pattern'
+    should not depend on any text in front of a match.
+    """
+    buf = ""
+    for data in itertools.chain(iter_stream(response, chunk_size), ("",)):
+        final = not data
+        buf += data
+        pos = 0
+        for match in pattern.finditer(buf):
+            if match.end() == len(buf) and not final:
+                pos = match.start()
+                break
+            yield match
+            pos = match.end()
+        else:
+            pos = max(pos, len(buf) - overlap)
+        buf = buf[pos:]
+
+
 def parse_bytes(value, default=0, suffixes="bkmgtp"):
     """Convert a bytes-amount ("500k", "2.5M", ...) to int"""
     try:
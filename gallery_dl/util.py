@@ -10,12 +10,23 @@
 
 import re
 import os
+import ast
 import sys
+import mmap
+import time
+import array
+import errno
+import heapq
 import shutil
+import bisect
+import builtins
 import string
 import _string
+import hashlib
 import sqlite3
 import datetime
+import operator
+import tempfile
 import itertools
 import urllib.parse
 from . import text, exception
@@ -123,6 +134,67 @@ def expand_path(path):
     return os.path.expandvars(os.path.expanduser(path))
 
 
+def copy_file(src, dst):
+    """Copy the contents of file 'src' to 'dst'
+
+    Data gets transferred inside the kernel with copy_file_range() or
+    sendfile() where available and with regular reads and writes
+    everywhere else.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        remaining = os.fstat(infd).st_size
+
+        # both functions advance the file offsets of 'infd' and 'outfd',
+        # so any of them can continue where a previous one failed
+        for func in _COPY_FUNCTIONS:
+            try:
+                while remaining:
+                    count = func(infd, outfd, min(remaining, 1 << 30))
+                    if not count:
+                        break
+                    remaining -= count
+            except OSError as exc:
+                if exc.errno not in _COPY_ERRNOS:
+                    raise
+            if not remaining:
+                return
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+
+
+def move_file(src, dst):
+    """Move file 'src' to 'dst' on a different filesystem
+
+    The new file only appears under its actual name when complete.
+    """
+    temp = dst + ".part"
+    try:
+        copy_file(src, temp)
+        os.replace(temp, dst)
+    except BaseException:
+        try:
+            os.unlink(temp)
+        except OSError:
+            pass
+        raise
+    os.unlink(src)
+
+
+_COPY_FUNCTIONS = []
+if hasattr(os, "copy_file_range"):
+    _COPY_FUNCTIONS.append(os.copy_file_range)
+if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+    # Linux supports regular files as output since 2.6.33
+    _COPY_FUNCTIONS.append(
+        lambda infd, outfd, count: os.sendfile(outfd, infd, None, count))
+
+# errors indicating that a copy function does not work for a pair of files
+_COPY_ERRNOS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+    errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTSOCK,
+}
+
+
 def code_to_language(code, default=None):
     """Map an ISO 639-1 language code to its actual name"""
     return CODES.get((code or "").lower(), default)
@@ -219,6 +291,136 @@ class UniquePredicate():
         return False
 
 
+class HashedUniquePredicate():
+    """Predicate; True if the hash of a URL is not in 'hashes' yet
+
+    Multiple predicates can share the same HashSet to deduplicate URLs
+    across jobs while storing only 8 bytes per URL.
+    """
+    def __init__(self, hashes):
+        self.hashes = hashes
+
+    def __call__(self, url, kwds):
+        if url.startswith("text:"):
+            return True
+        return self.hashes.add(hash64(url))
+
+
+def hash64(string):
+    """Return a 64-bit integer hash of 'string'"""
+    return int.from_bytes(
+        hashlib.sha1(string.encode()).digest()[:8], "little")
+
+
+class HashSet():
+    """Compact set of 64-bit integers
+
+    New values are collected in a regular set and regularly merged into
+    sorted array('Q') runs of increasing size, which need only 8 bytes
+    per entry. If 'limit' is given, all in-memory runs get written to a
+    temporary file as another sorted run whenever they hold more than
+    'limit' values.
+    """
+    BUFFER_SIZE = 4096
+    CHUNK_SIZE = 65536
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.buffer = set()
+        self.runs = []
+        self.size = 0
+        self.disk = []  # (file, mmap, memoryview) of each run on disk
+
+    def __contains__(self, value):
+        if value in self.buffer:
+            return True
+        for run in self.runs:
+            if self._search(run, value):
+                return True
+        for _, _, run in self.disk:
+            if self._search(run, value):
+                return True
+        return False
+
+    def __len__(self):
+        return len(self.buffer) + self.size + sum(
+            len(run) for _, _, run in self.disk)
+
+    def add(self, value):
+        """Add 'value' to the set; return False if it was already present"""
+        if value in self:
+            return False
+        self.buffer.add(value)
+        if len(self.buffer) >= self.BUFFER_SIZE:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Merge all buffered values into the sorted runs"""
+        if not self.buffer:
+            return
+        run = array.array("Q", sorted(self.buffer))
+        self.size += len(run)
+        self.buffer.clear()
+
+        runs = self.runs
+        while runs and len(runs[-1]) <= len(run):
+            # sorted() detects both already sorted runs in its input
+            # and merges them in linear time
+            run = array.array("Q", sorted(itertools.chain(runs.pop(), run)))
+        runs.append(run)
+
+        if self.limit and self.size > self.limit:
+            self.spill()
+
+    def spill(self):
+        """Write all in-memory runs into a temporary file
+
+        Like in-memory runs, the new run gets merged with the last runs
+        on disk that aren't larger than itself, so each value gets
+        rewritten only O(log n) times instead of on every spill.
+        """
+        merged = []
+        size = self.size
+        while self.disk and len(self.disk[-1][2]) <= size:
+            merged.append(self.disk.pop())
+            size += len(merged[-1][2])
+
+        fp = tempfile.TemporaryFile(prefix="gallery-dl-")
+        values = heapq.merge(*[run for _, _, run in merged] + self.runs)
+        while True:
+            chunk = array.array(
+                "Q", itertools.islice(values, self.CHUNK_SIZE))
+            if not chunk:
+                break
+            chunk.tofile(fp)
+        fp.flush()
+        del values
+
+        for run in merged:
+            self._close(*run)
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.disk.append((fp, mm, memoryview(mm).cast("Q")))
+        self.runs = []
+        self.size = 0
+
+    def close(self):
+        """Release all temporary files"""
+        while self.disk:
+            self._close(*self.disk.pop())
+
+    @staticmethod
+    def _close(fp, mm, run):
+        run.release()
+        mm.close()
+        fp.close()
+
+    @staticmethod
+    def _search(run, value):
+        index = bisect.bisect_left(run, value)
+        return index < len(run) and run[index] == value
+
+
 class FilterPredicate():
     """Predicate; True if evaluating the given expression returns True"""
     globalsdict = {
@@ -229,16 +431,261 @@ class FilterPredicate():
         "re": re,
     }
 
-    def __init__(self, codeobj):
-        self.codeobj = codeobj
+    def __init__(self, expr, target="image"):
+        self.expr = expr
+        self.func = compile_filter(
+            expr, "<{} filter>".format(target), self.globalsdict)
 
     def __call__(self, url, kwds):
+        return self.func(url, kwds)
+
+
+FILTER_TEMPLATE = """
+def func(_url, _kwds):
+    try:
+        return EXPR
+    except _GalleryDLException:
+        raise
+    except Exception as exc:
+        raise _FilterError(_undefined(exc, _kwds, _KEYWORDS))
+"""
+
+
+def compile_filter(expr, name="<filter>", globalsdict=None):
+    """Compile a filter expression into a Python function
+
+    The result is a predicate evaluating 'expr' for a single kwdict.
+    Names are looked up in a kwdict first, then in 'globalsdict' and
+    builtins, like eval(expr, globalsdict, kwdict).
+    Errors are raised as FilterError.
+    """
+    if globalsdict is None:
+        globalsdict = {}
+    compiler = FilterCompiler(globalsdict)
+    tree = compiler.visit(ast.parse(expr, name, "eval").body)
+
+    module = ast.parse(FILTER_TEMPLATE)
+    module.body[0].body[0].body[0].value = tree
+    ast.fix_missing_locations(module)
+
+    namespace = dict(globalsdict)
+    namespace.update(compiler.constants)
+    namespace["_GalleryDLException"] = exception.GalleryDLException
+    namespace["_FilterError"] = exception.FilterError
+    namespace["_KEYWORDS"] = frozenset(compiler.keywords)
+    namespace["_undefined"] = _undefined_keyword
+    exec(compile(module, name, "exec"), namespace)
+    return namespace["func"]
+
+
+def _undefined_keyword(exc, kwdict, keywords):
+    """Return the NameError eval() raised for keywords missing in 'kwdict'
+
+    Compiled filters look up keywords as '_kwds["name"]', which raises
+    a KeyError instead.
+    """
+    if isinstance(exc, KeyError) and len(exc.args) == 1:
+        name = exc.args[0]
+        if name in keywords and name not in kwdict:
+            return NameError("name '{}' is not defined".format(name))
+    return exc
+
+
+class FilterCompiler(ast.NodeTransformer):
+    """Rewrite a filter expression for compile_filter()
+
+    - Keywords become '_kwds["name"]' subscripts instead of name lookups
+      in an eval() locals mapping
+    - Names of 'globalsdict' and builtins use '_kwds.get()' to let
+      keywords with the same name take precedence, unless they are
+      the function of a call expression
+    - Operations and calls to pure functions with only constant operands
+      are evaluated once and replaced with their result
+    """
+    FOLD_OPERATORS = (ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare)
+    FOLD_FUNCTIONS = {
+        "abs", "bool", "float", "frozenset", "int", "len", "max", "min",
+        "str", "tuple", "datetime", "parse_int", "urlsplit",
+    }
+
+    def __init__(self, globalsdict):
+        self.globalsdict = globalsdict
+        self.constants = {}
+        self.keywords = set()
+        self.bound = set()
+
+    def visit_Name(self, node):
+        name = node.id
+        if not isinstance(node.ctx, ast.Load) or name in self.bound:
+            return node
+        if self._is_global(name):
+            source = "_kwds.get({0!r}, {0})".format(name)
+        else:
+            source = "_kwds[{!r}]".format(name)
+            self.keywords.add(name)
+        return ast.copy_location(_parse_expr(source), node)
+
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Name) and self._is_global(func.id) and \
+                func.id not in self.bound:
+            node.args = [self.visit(arg) for arg in node.args]
+            node.keywords = [self.visit(kw) for kw in node.keywords]
+            if func.id in self.FOLD_FUNCTIONS:
+                return self._fold(node, node.args + [
+                    kw.value for kw in node.keywords])
+            return node
+        return self.generic_visit(node)
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, (ast.Pow, ast.LShift, ast.Mult)):
+            return node
+        return self._fold(node, (node.left, node.right))
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        return self._fold(node, (node.operand,))
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        return self._fold(node, node.values)
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        return self._fold(node, [node.left] + node.comparators)
+
+    def visit_Lambda(self, node):
+        args = node.args
+        names = [arg for arg in args.args + args.kwonlyargs]
+        names.extend(arg for arg in (args.vararg, args.kwarg) if arg)
+        return self._visit_scope(node, {
+            getattr(arg, "arg", arg) for arg in names})
+
+    def visit_ListComp(self, node):
+        return self._visit_scope(node, {
+            target.id
+            for generator in node.generators
+            for target in ast.walk(generator.target)
+            if isinstance(target, ast.Name)
+        })
+
+    visit_SetComp = visit_DictComp = visit_GeneratorExp = visit_ListComp
+
+    def _visit_scope(self, node, names):
+        bound = self.bound
+        self.bound = bound | names
+        node = self.generic_visit(node)
+        self.bound = bound
+        return node
+
+    def _is_global(self, name):
+        return name in self.globalsdict or hasattr(builtins, name)
+
+    def _is_constant(self, node):
+        if isinstance(node, ast.Name):
+            return node.id in self.constants
         try:
-            return eval(self.codeobj, self.globalsdict, kwds)
-        except exception.GalleryDLException:
-            raise
-        except Exception as exc:
-            raise exception.FilterError(exc)
+            ast.literal_eval(node)
+            return True
+        except (ValueError, TypeError, SyntaxError):
+            return False
+
+    def _fold(self, node, operands):
+        """Replace 'node' with its value if all 'operands' are constant"""
+        if not all(map(self._is_constant, operands)):
+            return node
+        namespace = dict(self.globalsdict)
+        namespace.update(self.constants)
+        try:
+            expr = ast.fix_missing_locations(ast.Expression(node))
+            value = eval(compile(expr, "<fold>", "eval"), namespace)
+        except Exception:
+            return node
+
+        try:
+            if ast.literal_eval(repr(value)) == value and \
+                    type(value) in (int, float, str, bytes, bool):
+                return ast.copy_location(_parse_expr(repr(value)), node)
+        except (ValueError, TypeError, SyntaxError):
+            pass
+        name = "_const{}".format(len(self.constants))
+        self.constants[name] = value
+        return ast.copy_location(ast.Name(name, ast.Load()), node)
+
+
+def _parse_expr(source):
+    return ast.parse(source, mode="eval").body
+
+
+def parse_constraints(expr):
+    """Extract simple comparisons from a filter expression
+
+    Returns a list of (key, operator, value)-tuples for all comparisons
+    between a keyword and a literal value that must hold for 'expr' to be
+    True, i.e. that are not part of an 'or' or 'not' expression.
+
+    Examples
+        parse_constraints("score > 100 and rating == 's'")
+            -> [("score", ">", 100), ("rating", "==", "s")]
+        parse_constraints("1000 <= id < 2000 or score > 100")
+            -> []
+    """
+    try:
+        tree = ast.parse(expr, mode="eval").body
+    except (SyntaxError, ValueError, TypeError):
+        return []
+    constraints = []
+    _constraints(tree, constraints)
+    return constraints
+
+
+def _constraints(node, result):
+    if isinstance(node, ast.BoolOp):
+        if isinstance(node.op, ast.And):
+            for value in node.values:
+                _constraints(value, result)
+        return
+    if not isinstance(node, ast.Compare):
+        return
+
+    left = node.left
+    for op, right in zip(node.ops, node.comparators):
+        op = COMPARISON_OPERATORS.get(op.__class__)
+        if op:
+            if isinstance(left, ast.Name):
+                key, value, reverse = left.id, right, False
+            elif isinstance(right, ast.Name):
+                key, value, reverse = right.id, left, True
+            else:
+                key = None
+
+            if key:
+                try:
+                    value = ast.literal_eval(value)
+                except (ValueError, TypeError):
+                    pass
+                else:
+                    if reverse:
+                        op = REVERSED_OPERATORS.get(op, op)
+                    result.append((key, op, value))
+        left = right
+
+
+COMPARISON_OPERATORS = {
+    ast.Eq: "==",
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+}
+
+REVERSED_OPERATORS = {
+    "<": ">",
+    "<=": ">=",
+    ">": "<",
+    ">=": "<=",
+}
 
 
 class ChainPredicate():
@@ -298,30 +745,79 @@ class Formatter():
 
     def __init__(self, default=None):
         self.kwdefault = default
+        self.format_cache = {}
 
     def vformat(self, format_string, kwargs):
         """Apply 'kwargs' to the initial format_string and return its result"""
-        result = []
-        append = result.append
+        try:
+            func = self.format_cache[format_string]
+        except KeyError:
+            func = self.format_cache[format_string] = \
+                self.build(format_string)
+        return func(kwargs)
+
+    def build(self, format_string):
+        """Compile 'format_string' into a function taking a 'kwargs' dict
+
+        Parsing the format string, splitting field names and preparing
+        conversions and format specifiers happens only once; the returned
+        function merely looks up values and joins the results.
+        """
+        funcs = []
+        append = funcs.append
 
         for literal_text, field_name, format_spec, conversion in \
                 _string.formatter_parser(format_string):
-
             if literal_text:
-                append(literal_text)
-
+                append(self._literal(literal_text))
             if field_name:
-                obj = self.get_field(field_name, kwargs)
-                if conversion:
-                    obj = self.conversions[conversion](obj)
-                if format_spec:
-                    format_spec = format_spec.format_map(kwargs)
-                    obj = self.format_field(obj, format_spec)
-                else:
-                    obj = str(obj)
-                append(obj)
+                append(self._field(field_name, format_spec, conversion))
 
-        return "".join(result)
+        if not funcs:
+            return self._literal("")
+        if len(funcs) == 1:
+            return funcs[0]
+        return lambda kwargs: "".join([func(kwargs) for func in funcs])
+
+    @staticmethod
+    def _literal(literal_text):
+        return lambda _: literal_text
+
+    def _field(self, field_name, format_spec, conversion):
+        getter = self._getter(field_name)
+        conv = self.conversions[conversion] if conversion else None
+
+        if format_spec and "{" in format_spec:
+            # nested replacement fields
+            format_field = self.format_field
+
+            def wrap(kwargs):
+                obj = getter(kwargs)
+                if conv:
+                    obj = conv(obj)
+                return format_field(obj, format_spec.format_map(kwargs))
+            return wrap
+
+        fmt = self._format_func(format_spec)
+        if conv:
+            return lambda kwargs: fmt(conv(getter(kwargs)))
+        return lambda kwargs: fmt(getter(kwargs))
+
+    @staticmethod
+    def _format_func(format_spec):
+        """Return a function applying 'format_spec' to a value"""
+        if not format_spec:
+            return str
+        if format_spec[0] == "?":
+            before, after, format_spec = format_spec.split("/", 2)
+            before = before[1:]
+
+            def optional(value):
+                if not value:
+                    return ""
+                return before + format(value, format_spec) + after
+            return optional
+        return lambda value: format(value, format_spec)
 
     @staticmethod
     def format_field(value, format_spec):
@@ -333,28 +829,48 @@ class Formatter():
             return before[1:] + format(value, format_spec) + after
         return format(value, format_spec)
 
-    def get_field(self, field_name, kwargs):
-        """Return value with key 'field_name' from 'kwargs'"""
+    def _getter(self, field_name):
+        """Return a function to get the value of 'field_name' from kwargs"""
         first, rest = _string.formatter_field_name_split(field_name)
+        default = self.kwdefault
 
-        if first not in kwargs:
-            return self.kwdefault
-
-        obj = kwargs[first]
-        for is_attr, i in rest:
+        funcs = []
+        for is_attr, key in rest:
             if is_attr:
-                obj = getattr(obj, i)
-            elif ":" in i:
-                start, _, stop = i.partition(":")
-                start = int(start) if start else 0
-                return obj[start:int(stop)] if stop else obj[start:]
+                funcs.append(operator.attrgetter(key))
+            elif isinstance(key, str) and ":" in key:
+                start, _, stop = key.partition(":")
+                key = slice(int(start) if start else 0,
+                            int(stop) if stop else None)
+                funcs.append(operator.itemgetter(key))
+                break
             else:
-                obj = obj[i]
+                funcs.append(operator.itemgetter(key))
+
+        if not funcs:
+            return lambda kwargs: kwargs.get(first, default)
 
-        return obj
+        def getter(kwargs):
+            if first not in kwargs:
+                return default
+            obj = kwargs[first]
+            for func in funcs:
+                obj = func(obj)
+            return obj
+        return getter
+
+    def get_field(self, field_name, kwargs):
+        """Return value with key 'field_name' from 'kwargs'"""
+        return self._getter(field_name)(kwargs)
 
 
 class PathFormat():
+    directories = set()  # process-wide cache of existing directories
+
+    # extensions of files that are never the result of a download and
+    # must not count as matches for a file's stem: leftovers of
+    # incomplete downloads and metadata sidecar files
+    STEM_IGNORE = frozenset(("part", "size", "json"))
 
     def __init__(self, extractor):
         self.filename_fmt = extractor.config(
@@ -363,8 +879,23 @@ class PathFormat():
             "directory", extractor.directory_fmt)
         self.formatter = Formatter(extractor.config("keywords-default"))
 
+        try:
+            self.build_filename = self.formatter.build(self.filename_fmt)
+        except Exception as exc:
+            raise exception.FormatError(exc, "filename")
+        try:
+            self.build_directory = [
+                self.formatter.build(segment)
+                for segment in self.directory_fmt
+            ]
+        except Exception as exc:
+            raise exception.FormatError(exc, "directory")
+
         self.delete = False
         self.has_extension = False
+        self.indexes = {}
+        self.index = self.stems = None
+        self.scan = False
         self.keywords = {}
         self.filename = ""
         self.directory = self.realdirectory = ""
@@ -383,17 +914,29 @@ class PathFormat():
                 self._skipexc = exit
             else:
                 self._skipexc = None
+            self.scan = extractor.config("directory-scan", False)
         else:
             self.exists = lambda x=None: False
 
     def open(self, mode="wb"):
         """Open file and return a corresponding file object"""
-        return open(self.temppath, mode)
+        try:
+            return open(self.temppath, mode)
+        except FileNotFoundError:
+            if "r" in mode:
+                raise
+            # directory got removed after it had been created and cached
+            self.create_directory(os.path.dirname(self.temppath), True)
+            return open(self.temppath, mode)
 
     def exists(self, archive=None):
         """Return True if the file exists on disk or in 'archive'"""
-        if (self.has_extension and os.path.exists(self.realpath) or
-                archive and archive.check(self.keywords)):
+        if self.has_extension:
+            found = self.check_file()
+        else:
+            found = self.check_stem()
+
+        if found or archive and archive.check(self.keywords):
             if self._skipexc:
                 raise self._skipexc()
             if not self.has_extension:
@@ -403,13 +946,45 @@ class PathFormat():
             return True
         return False
 
+    def check_file(self):
+        """Return True if a file at 'realpath' exists"""
+        if self.index is not None:
+            return self.filename in self.index
+        return os.path.exists(self.realpath)
+
+    def check_stem(self):
+        """Look for a file with the current filename and any extension
+
+        If one is found, its extension gets used for the current file.
+        This only works for filename formats ending in '.{extension}'.
+        Without 'directory-scan', the target directory gets listed once on
+        the first call and matches are confirmed with an additional stat().
+        """
+        try:
+            filename = text.clean_path(self.build_filename(
+                dict(self.keywords, extension="")))
+        except Exception as exc:
+            raise exception.FormatError(exc, "filename")
+        if not filename or filename[-1] != ".":
+            return False
+
+        if self.stems is None:
+            self.stems = self._scan_directory()[1]
+        name = self.stems.get(filename[:-1])
+        if not name:
+            return False
+        if self.index is None and not os.path.exists(
+                self.realdirectory + os.sep + name):
+            return False
+        self.set_extension(name[len(filename):])
+        return True
+
     def set_directory(self, keywords):
         """Build directory path and create it if necessary"""
         try:
             segments = [
-                text.clean_path(
-                    self.formatter.vformat(segment, keywords).strip())
-                for segment in self.directory_fmt
+                text.clean_path(build(keywords).strip())
+                for build in self.build_directory
             ]
         except Exception as exc:
             raise exception.FormatError(exc, "directory")
@@ -425,12 +1000,51 @@ class PathFormat():
             self.directory = self.directory[:-1]
 
         self.realdirectory = self.adjust_path(self.directory)
-        os.makedirs(self.realdirectory, exist_ok=True)
+        self.create_directory(self.realdirectory)
+        if self.scan:
+            self.index, self.stems = self._scan_directory()
+        else:
+            self.index = self.stems = None
+
+    def create_directory(self, path, force=False):
+        """Create directory 'path' unless it is known to exist"""
+        if force:
+            self.directories.discard(path)
+        elif path in self.directories:
+            return
+        os.makedirs(path, exist_ok=True)
+        self.directories.add(path)
+
+    def _scan_directory(self):
+        """Return the names of all files in 'realdirectory' and their stems"""
+        directory = self.realdirectory
+        try:
+            return self.indexes[directory]
+        except KeyError:
+            pass
+
+        try:
+            names = set(os.listdir(directory))
+        except OSError:
+            names = set()
+        stems = {}
+        for name in names:
+            self._add_stem(stems, name)
+        self.indexes[directory] = result = (names, stems)
+        return result
+
+    @classmethod
+    def _add_stem(cls, stems, name):
+        stem, dot, extension = name.rpartition(".")
+        if dot and stem not in stems and \
+                extension.lower() not in cls.STEM_IGNORE:
+            stems[stem] = name
 
     def set_keywords(self, keywords):
         """Set filename keywords"""
         self.keywords = keywords
         self.temppath = ""
+        self.delete = False
         self.has_extension = bool(keywords.get("extension"))
         if self.has_extension:
             self.build_path()
@@ -445,7 +1059,7 @@ class PathFormat():
         """Use filename-keywords and directory to build a full path"""
         try:
             self.filename = text.clean_path(
-                self.formatter.vformat(self.filename_fmt, self.keywords))
+                self.build_filename(self.keywords))
         except Exception as exc:
             raise exception.FormatError(exc, "filename")
 
@@ -468,31 +1082,80 @@ class PathFormat():
             )
 
     def part_size(self):
-        """Return size of .part file"""
+        """Return size of .part file
+
+        A size set by set_part_size() for a preallocated file takes
+        precedence over the file's actual size, regardless of whether
+        preallocation is still enabled.
+        """
         try:
-            return os.stat(self.temppath).st_size
+            size = os.stat(self.temppath).st_size
         except OSError:
-            pass
-        return 0
+            return 0
+        if size:
+            try:
+                with open(self.temppath + ".size") as file:
+                    return int(file.read())
+            except (OSError, ValueError):
+                pass
+        return size
+
+    def set_part_size(self, size):
+        """Store the amount of valid data in a preallocated .part file
+
+        'None' marks the file's actual size as valid again.
+        """
+        path = self.temppath + ".size"
+        if size is None:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        else:
+            with open(path, "w") as file:
+                file.write(str(size))
+
+    def finalize(self, submit=None):
+        """Move tempfile to its target location
 
-    def finalize(self):
-        """Move tempfile to its target location"""
+        If that requires copying it to another filesystem and 'submit' is
+        given, 'submit(func, *args)' gets to run the actual move and its
+        return value, a Future, is returned.
+        """
         if self.delete:
             self.delete = False
-            os.unlink(self.temppath)
+            try:
+                os.unlink(self.temppath)
+            except FileNotFoundError:
+                pass
             return
 
+        if self.stems is not None:
+            directory, _, name = self.realpath.rpartition(os.sep)
+            if directory == self.realdirectory:
+                if self.index is not None:
+                    self.index.add(name)
+                self._add_stem(self.stems, name)
+
         if self.temppath == self.realpath:
             return
 
         try:
             os.replace(self.temppath, self.realpath)
             return
+        except FileNotFoundError:
+            self.create_directory(os.path.dirname(self.realpath), True)
+            try:
+                os.replace(self.temppath, self.realpath)
+                return
+            except OSError:
+                pass
         except OSError:
             pass
 
-        shutil.copyfile(self.temppath, self.realpath)
-        os.unlink(self.temppath)
+        if submit:
+            return submit(move_file, self.temppath, self.realpath)
+        move_file(self.temppath, self.realpath)
 
     @staticmethod
     def adjust_path(path):
@@ -501,26 +1164,144 @@ class PathFormat():
 
 
 class DownloadArchive():
+    """SQLite3 database of downloaded files
+
+    Besides the archive ID ('entry'), each row stores the file's category,
+    path, size, content hash and the time it was added.
+    New rows are collected in memory and written in batches of
+    'archive-batch' entries (and on close()) to keep insertions cheap.
 
-    def __init__(self, path, extractor):
-        con = sqlite3.connect(path)
-        con.isolation_level = None
-        self.cursor = con.cursor()
-        self.cursor.execute("CREATE TABLE IF NOT EXISTS archive "
-                            "(entry PRIMARY KEY) WITHOUT ROWID")
-        self.keygen = (extractor.category + extractor.config(
-            "archive-format", extractor.archive_fmt)
-        ).format_map
+    With 'readonly=True', the database file is opened in read-only mode
+    and left exactly as it is, i.e. without adding missing columns.
+    """
+    COLUMNS = ("entry", "category", "path", "size", "hash", "timestamp")
+
+    def __init__(self, path, extractor=None, readonly=False):
+        if readonly:
+            if sys.version_info < (3, 4):
+                # no 'uri' parameter; the database still doesn't get
+                # modified, since nothing but SELECT statements get used
+                con = sqlite3.connect(path)
+            else:
+                con = sqlite3.connect(
+                    "file:" + urllib.parse.quote(path) + "?mode=ro",
+                    uri=True)
+            self.cursor = con.cursor()
+            self.cursor.execute("PRAGMA table_info(archive)")
+            self.columns = {row[1] for row in self.cursor.fetchall()}
+        else:
+            con = sqlite3.connect(path)
+            con.isolation_level = None
+            self.cursor = con.cursor()
+            self.cursor.execute("CREATE TABLE IF NOT EXISTS archive "
+                                "(entry PRIMARY KEY, category, path, "
+                                "size INTEGER, hash, timestamp INTEGER) "
+                                "WITHOUT ROWID")
+            self._upgrade()
+            self.columns = set(self.COLUMNS)
+        self.pending = {}
+        self.batch = 1
+
+        if extractor:
+            self.category = extractor.category
+            self.keygen = (extractor.category + extractor.config(
+                "archive-format", extractor.archive_fmt)
+            ).format_map
+            self.batch = extractor.config("archive-batch", 20)
 
     def check(self, kwdict):
         """Return True if item described by 'kwdict' exists in archive"""
         key = self.keygen(kwdict)
+        if key in self.pending:
+            return True
         self.cursor.execute(
             "SELECT 1 FROM archive WHERE entry=? LIMIT 1", (key,))
         return self.cursor.fetchone()
 
-    def add(self, kwdict):
+    def add(self, kwdict, pathfmt=None):
         """Add item described by 'kwdict' to archive"""
         key = self.keygen(kwdict)
+        path = size = digest = None
+        hashes = kwdict.get("_hashes")
+        if hashes:
+            algorithm, value = next(iter(hashes.items()))
+            digest = algorithm + ":" + value
+        if pathfmt:
+            path = pathfmt.path
+            try:
+                size = os.stat(pathfmt.realpath).st_size
+            except OSError:
+                pass
+        self.pending[key] = (
+            key, self.category, path, size, digest, int(time.time()))
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        """Write all pending entries to the database"""
+        if not self.pending:
+            return
+        self.cursor.execute("BEGIN")
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO archive (entry, category, path, size, "
+            "hash, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            self.pending.values())
+        self.cursor.execute("COMMIT")
+        self.pending.clear()
+
+    def close(self):
+        """Write pending entries and close the database connection"""
+        self.flush()
+        self.cursor.connection.close()
+
+    def select(self, category=None, since=None):
+        """Return an iterator over all matching archive entries as dicts"""
+        col = self._column
+        where, params = self._where(category, since)
+        self.cursor.execute(
+            "SELECT " + ", ".join(map(col, self.COLUMNS)) + " FROM archive" +
+            where + " ORDER BY " + col("timestamp") + ", entry", params)
+        return (dict(zip(self.COLUMNS, row)) for row in self.cursor)
+
+    def summary(self, category=None, since=None):
+        """Return a list of (category, files, bytes)-tuples"""
+        col = self._column
+        where, params = self._where(category, since)
         self.cursor.execute(
-            "INSERT OR IGNORE INTO archive VALUES (?)", (key,))
+            "SELECT " + col("category") + ", COUNT(*), TOTAL(" +
+            col("size") + ") FROM archive" + where +
+            " GROUP BY 1 ORDER BY 1", params)
+        return [(cat, num, int(size)) for cat, num, size in self.cursor]
+
+    def _column(self, name):
+        """Return 'name' or NULL for columns missing in older archives"""
+        return name if name in self.columns else "NULL"
+
+    def _where(self, category, since):
+        conditions = []
+        params = []
+        if category:
+            conditions.append(self._column("category") + "=?")
+            params.append(category)
+        if since:
+            conditions.append(self._column("timestamp") + ">=?")
+            params.append(since)
+        if not conditions:
+            return "", params
+        return " WHERE " + " AND ".join(conditions), params
+
+    def _upgrade(self):
+        """Add columns missing in archive files of older versions"""
+        self.cursor.execute("PRAGMA table_info(archive)")
+        columns = {row[1] for row in self.cursor.fetchall()}
+        for column in self.COLUMNS:
+            if column not in columns:
+                try:
+                    self.cursor.execute(
+                        "ALTER TABLE archive ADD COLUMN " + column)
+                except sqlite3.OperationalError:
+                    pass  # added by another process in the meantime
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS archive_category "
+                            "ON archive (category, timestamp)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS archive_timestamp "
+                            "ON archive (timestamp)")
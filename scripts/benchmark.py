@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2018 Mike Fährmann
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+
+"""Run micro-benchmarks for performance-critical parts of gallery-dl"""
+
+import re
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.realpath(
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), "..")))
+
+from gallery_dl import text, util, exception, aes  # noqa
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a function as benchmark"""
+    def wrap(func):
+        BENCHMARKS[name] = func
+        return func
+    return wrap
+
+
+def measure(label, func, *args):
+    """Run 'func' with 'args' and print how long it took"""
+    start = time.perf_counter()
+    func(*args)
+    delta = time.perf_counter() - start
+    print("  {:<40} {:>8.3f}s".format(label, delta))
+    return delta
+
+
+@benchmark("formatter")
+def bench_formatter(num):
+    fmt = "{manga}_c{chapter:>03}{chapter_minor:?//}_{page:>03}.{extension}"
+    kwdicts = [
+        {
+            "manga": "Manga Title",
+            "chapter": i // 20,
+            "chapter_minor": ".5" if i % 7 == 0 else "",
+            "page": i % 20 + 1,
+            "extension": "jpg",
+        }
+        for i in range(num)
+    ]
+
+    def parse_every_time(kwdicts):
+        for kwdict in kwdicts:
+            util.Formatter().build(fmt)(kwdict)
+
+    def vformat(kwdicts):
+        formatter = util.Formatter()
+        for kwdict in kwdicts:
+            formatter.vformat(fmt, kwdict)
+
+    def compiled(kwdicts):
+        func = util.Formatter().build(fmt)
+        for kwdict in kwdicts:
+            func(kwdict)
+
+    measure("parse + apply", parse_every_time, kwdicts)
+    measure("Formatter.vformat (cached)", vformat, kwdicts)
+    measure("Formatter.build", compiled, kwdicts)
+
+
+@benchmark("filter")
+def bench_filter(num):
+    expr = "score >= 10 and rating in ('s', 'q') and width * height > 2**20"
+    kwdicts = [
+        {
+            "id": i,
+            "score": i % 50,
+            "rating": "sqe"[i % 3],
+            "width": 1000 + i % 1000,
+            "height": 1000 + i % 500,
+        }
+        for i in range(num)
+    ]
+    pred = util.FilterPredicate(expr)
+
+    def evaluate(kwdicts):
+        # previous FilterPredicate.__call__
+        codeobj = compile(expr, "<filter>", "eval")
+        globalsdict = util.FilterPredicate.globalsdict
+        for kwdict in kwdicts:
+            try:
+                eval(codeobj, globalsdict, kwdict)
+            except exception.GalleryDLException:
+                raise
+            except Exception as exc:
+                raise exception.FilterError(exc)
+
+    def compiled(kwdicts):
+        func = pred.func
+        for kwdict in kwdicts:
+            func(None, kwdict)
+
+    def chain(kwdicts):
+        func = util.build_predicate([util.UniquePredicate(), pred.func])
+        for kwdict in kwdicts:
+            func("", kwdict)
+
+    measure("eval()", evaluate, kwdicts)
+    measure("compiled", compiled, kwdicts)
+    measure("compiled + UniquePredicate", chain, kwdicts)
+
+
+@benchmark("text")
+def bench_text(num):
+    rules = (
+        ("type" , ' alt="', '"'),
+        ("date" , 'nowrap">', '<'),
+        ("url"  , ' class="it5"><a href="', '"'),
+        ("title", '>', '<'),
+    )
+    rows = [
+        ('<tr class="gtr0"><td class="itdc"><img alt="Manga" /></td>'
+         '<td class="itd" style="white-space:nowrap">2018-07-{:>02} 12:00'
+         '</td><td class="itd"><div class="it5"><a href="https://exhentai'
+         '.org/g/{}/0123456789/">Title {}</a></div></td></tr>').format(
+             i % 30, i, i)
+        for i in range(num)
+    ]
+
+    def extract_all(rows):
+        for row in rows:
+            text.extract_all(row, rules)
+
+    def compiled(rows):
+        extr = text.compile_rules(rules)
+        for row in rows:
+            extr(row)
+
+    def remove_html_uncompiled(rows):
+        for row in rows:
+            " ".join(re.sub("<[^>]+>", " ", row).split())
+
+    def remove_html(rows):
+        for row in rows:
+            text.remove_html(row)
+
+    measure("text.extract_all", extract_all, rows)
+    measure("text.compile_rules", compiled, rows)
+    measure("remove_html (re.sub)", remove_html_uncompiled, rows)
+    measure("text.remove_html", remove_html, rows)
+
+
+@benchmark("aes")
+def bench_aes(num):
+    key = list(range(32))
+    iv = list(range(16))
+    data = bytes(i & 255 for i in range(num // 16 * 16 or 16))
+
+    def lists(data):
+        aes.aes_cbc_decrypt(list(data), key, iv)
+
+    def words(data):
+        aes.aes_cbc_decrypt_words(
+            data, aes.key_expansion_words(key), bytes(iv))
+
+    measure("aes_cbc_decrypt (int lists)", lists, data)
+    measure("aes_cbc_decrypt_words (T-tables)", words, data)
+    if aes.Cipher:
+        measure("aes_cbc_decrypt_bytes (cryptography)",
+                aes.aes_cbc_decrypt_bytes, data, bytes(key), bytes(iv))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n", "--number", type=int, default=100000,
+        help="Number of items per benchmark (default: 100000)")
+    parser.add_argument(
+        "benchmarks", nargs="*", metavar="NAME",
+        help="Benchmarks to run ({})".format(", ".join(sorted(BENCHMARKS))))
+    args = parser.parse_args()
+
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        if name not in BENCHMARKS:
+            print("Unknown benchmark '{}'".format(name), file=sys.stderr)
+            continue
+        print("{} ({} items):".format(name, args.number))
+        BENCHMARKS[name](args.number)
+
+
+if __name__ == "__main__":
+    main()
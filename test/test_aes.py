@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2018 Mike Fährmann
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+
+import unittest
+from unittest import mock
+
+from gallery_dl import aes
+
+
+# FIPS-197, Appendix C
+KEY = bytes(range(32))
+PLAINTEXT = bytes.fromhex("00112233445566778899aabbccddeeff")
+CIPHERTEXTS = {
+    16: bytes.fromhex("69c4e0d86a7b0430d8cdb78070b4c55a"),
+    24: bytes.fromhex("dda97ca4864cdfe06eaf70a0ec0d7191"),
+    32: bytes.fromhex("8ea2b7ca516745bfeafc49904b496089"),
+}
+
+
+class TestAES(unittest.TestCase):
+
+    def test_decrypt_block(self):
+        iv = bytes(16)
+        for size, cipher in CIPHERTEXTS.items():
+            key = KEY[:size]
+            self.assertEqual(
+                bytes(aes.aes_cbc_decrypt(list(cipher), list(key), list(iv))),
+                PLAINTEXT)
+            self.assertEqual(
+                aes.aes_cbc_decrypt_words(
+                    cipher, aes.key_expansion_words(list(key)), iv),
+                PLAINTEXT)
+
+    @mock.patch.object(aes, "Cipher", None)
+    def test_decrypt_cbc(self):
+        key = list(KEY[:16])
+        iv = list(range(16, 32))
+        data = list(range(256)) * 3 + [1, 2, 3]
+
+        expected = bytes(aes.aes_cbc_decrypt(data, key, iv))
+        result = aes.aes_cbc_decrypt_bytes(bytes(data), bytes(key), bytes(iv))
+        self.assertEqual(len(result), len(data))
+        self.assertEqual(result, expected)
+
+    def test_decrypt_text(self):
+        # openssl enc -aes-128-cbc -K 000102...0f -iv 0f0e0d...00 | base64
+        data = "Hl3VhKJ2mWNfEnrktZAV01VbI31WUgU2dRyblzE/LNY="
+        key = list(range(16))
+        iv = key[::-1]
+        self.assertEqual(
+            aes.aes_cbc_decrypt_text(data, key, iv),
+            "https://example.org/image.jpg")
+
+
+if __name__ == "__main__":
+    unittest.main()
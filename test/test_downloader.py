@@ -9,6 +9,7 @@
 
 import re
 import base64
+import hashlib
 import os.path
 import tempfile
 import unittest
@@ -20,7 +21,8 @@ import requests
 import gallery_dl.downloader as downloader
 import gallery_dl.extractor as extractor
 import gallery_dl.config as config
-from gallery_dl.downloader.common import DownloaderBase
+import gallery_dl.exception as exception
+from gallery_dl.downloader.common import DownloaderBase, FILETYPE_CHECK
 from gallery_dl.output import NullOutput
 from gallery_dl.util import PathFormat
 
@@ -122,6 +124,21 @@ class TestHTTPDownloader(TestDownloaderBase):
         self._run_test(self._png, None, DATA_PNG, "gif", "png")
         self._run_test(self._gif, None, DATA_GIF, "jpg", "gif")
 
+    def test_http_adjust_extension_part(self):
+        pathfmt = self._prepare_destination(extension="png")
+        self.assertTrue(self.downloader.download(self._jpg, pathfmt))
+        self.assertTrue(pathfmt.temppath.endswith(".jpg.part"))
+        self.assertFalse(os.path.exists(pathfmt.realpath[:-4] + ".png.part"))
+
+    def test_http_adjust_extension_exists(self):
+        pathfmt = self._prepare_destination(extension="png")
+        with open(pathfmt.realpath[:-4] + ".jpg", "wb"):
+            pass
+        self.assertTrue(self.downloader.download(self._jpg, pathfmt))
+        self.assertEqual(pathfmt.temppath, "")
+        self.assertEqual(pathfmt.keywords["extension"], "jpg")
+        self.assertEqual(os.path.getsize(pathfmt.realpath), 0)
+
 
 class TestTextDownloader(TestDownloaderBase):
 
@@ -142,6 +159,110 @@ class TestTextDownloader(TestDownloaderBase):
     def test_text_empty(self):
         self._run_test("text:", None, "", "txt", "txt")
 
+    def test_text_adjust_extension_skip(self):
+        dl = downloader.find("text")(None, NullOutput())
+        dl.part = False
+
+        for skip, exc in (("abort", exception.StopExtraction),
+                          ("exit", SystemExit)):
+            config.set(("extractor", "skip"), skip)
+            try:
+                pathfmt = self._prepare_destination(extension="png")
+            finally:
+                config.unset(("extractor", "skip"))
+            path = pathfmt.realpath[:-4] + ".svg"
+            with open(path, "wb") as file:
+                file.write(b"<svg/>")
+
+            with self.assertRaises(exc):
+                dl.download("text:<svg>" + " " * 300 + "</svg>", pathfmt)
+            with open(path, "rb") as file:
+                self.assertEqual(file.read(), b"<svg/>")
+
+    def test_text_hashes(self):
+        dl = downloader.find("text")(None, NullOutput())
+        dl.hashes = ("sha1", "md5")
+        data = b"foobar"
+
+        for offset in (0, 3):
+            pathfmt = self._prepare_destination(data[:offset], extension="txt")
+            self.assertTrue(dl.download("text:foobar", pathfmt))
+            self.assertEqual(list(pathfmt.keywords["_hashes"].items()), [
+                ("sha1", hashlib.sha1(data).hexdigest()),
+                ("md5", hashlib.md5(data).hexdigest()),
+            ])
+
+    def test_text_preallocate(self):
+        dl = downloader.find("text")(None, NullOutput())
+        dl.preallocate = True
+
+        for content in (None, "foo"):
+            pathfmt = self._prepare_destination(content, extension="txt")
+            self.assertTrue(dl.download("text:foobar", pathfmt))
+            with pathfmt.open("rb") as file:
+                self.assertEqual(file.read(), b"foobar")
+            self.assertFalse(os.path.exists(pathfmt.temppath + ".size"))
+
+    def test_text_preallocate_resume(self):
+        # resume a preallocated download with 'preallocate' disabled
+        pathfmt = self._prepare_destination(extension="txt")
+        pathfmt.part_enable()
+        with pathfmt.open("wb") as file:
+            file.write(b"foo" + bytes(100))
+        pathfmt.set_part_size(3)
+
+        dl = downloader.find("text")(None, NullOutput())
+        self.assertTrue(dl.download("text:foobar", pathfmt))
+        with pathfmt.open("rb") as file:
+            self.assertEqual(file.read(), b"foobar")
+        self.assertFalse(os.path.exists(pathfmt.temppath + ".size"))
+
+    def test_text_verify_md5(self):
+        dl = downloader.find("text")(None, NullOutput())
+        dl.verify_md5 = True
+        md5 = hashlib.md5(b"foobar").hexdigest()
+
+        pathfmt = self._prepare_destination(extension="txt")
+        pathfmt.keywords["md5"] = md5.upper()
+        self.assertTrue(dl.download("text:foobar", pathfmt))
+        self.assertEqual(pathfmt.keywords["_hashes"], {"md5": md5})
+
+        pathfmt = self._prepare_destination(extension="txt")
+        pathfmt.keywords["md5"] = "0" * 32
+        self.assertFalse(dl.download("text:foobar", pathfmt))
+        self.assertNotIn("_hashes", pathfmt.keywords)
+        self.assertFalse(os.path.exists(pathfmt.temppath))
+
+
+class TestFiletypeCheck(unittest.TestCase):
+
+    def test_filetype_check(self):
+        headers = {
+            "jpg" : DATA_JPG,
+            "png" : DATA_PNG,
+            "gif" : DATA_GIF,
+            "webp": b"RIFF\x24\x00\x00\x00WEBPVP8 ",
+            "bmp" : b"BM\x3a\x00\x00\x00\x00\x00\x00\x00\x36\x00",
+            "svg" : b'<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/',
+            "mp4" : b"\x00\x00\x00\x20ftypisom\x00\x00\x02\x00",
+            "webm": b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\xf7\x81"
+                    b"\x01\x42\xf2\x81\x04\x42\xf3\x81\x08\x42\x82\x84webm",
+            "ogg" : b"OggS\x00\x02\x00\x00\x00\x00\x00\x00\x00\x00",
+            "mp3" : b"\xff\xfb\x90\x64\x00\x00\x00\x00\x00\x00",
+            "zip" : b"PK\x03\x04\x14\x00\x00\x00\x08\x00",
+        }
+        self.assertEqual(sorted(headers), sorted(FILETYPE_CHECK))
+
+        for extension, header in headers.items():
+            matches = [ext for ext, check in FILETYPE_CHECK.items()
+                       if check(header)]
+            self.assertEqual(matches, [extension])
+
+        self.assertTrue(FILETYPE_CHECK["mp3"](b"ID3\x03\x00\x00\x00\x00"))
+        self.assertFalse(FILETYPE_CHECK["mp4"](b"\x00\x00\x00\x18ftypheic"))
+        self.assertFalse(FILETYPE_CHECK["webm"](
+            b"\x1a\x45\xdf\xa3\x9f\x42\x82\x88matroska"))
+
 
 class FakeDownloader(DownloaderBase):
     scheme = "fake"
@@ -162,7 +283,7 @@ class FakeDownloader(DownloaderBase):
         pass
 
     @staticmethod
-    def _check_extension(file, pathfmt):
+    def _check_extension(header, pathfmt):
         pass
 
 
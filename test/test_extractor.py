@@ -10,6 +10,8 @@
 import sys
 import unittest
 
+import requests
+
 import gallery_dl.extractor as extractor
 from gallery_dl.extractor.common import Extractor, Message
 from gallery_dl.extractor.directlink import DirectlinkExtractor as DLExtractor
@@ -167,6 +169,38 @@ class TestExtractor(unittest.TestCase):
                 )
                 self.assertEqual(expected, extr.__name__)
 
+    def test_set_encoding(self):
+        def response(content, ctype="text/html", encoding=None):
+            resp = requests.Response()
+            resp._content = content
+            resp.headers["Content-Type"] = ctype
+            resp.encoding = encoding
+            resp.url = "fake:"
+            return resp
+
+        extr = FakeExtractor()
+        text = "äöü €"
+
+        resp = response(text.encode("utf-8"))
+        extr._set_encoding(resp)
+        self.assertEqual(resp.encoding, "utf-8")
+        self.assertEqual(resp.text, text)
+
+        resp = response(b"", "text/html; charset=iso-8859-1", "ISO-8859-1")
+        extr._set_encoding(resp)
+        self.assertEqual(resp.encoding, "ISO-8859-1")
+
+        resp = response(b"\xff\xd8\xff", "image/jpeg")
+        extr._set_encoding(resp)
+        self.assertIsNone(resp.encoding)
+
+        detections = Extractor.detections
+        resp = response(text.encode("utf-16"))
+        with self.assertLogs(extr.log, "WARNING"):
+            extr._set_encoding(resp)
+        self.assertEqual(Extractor.detections, detections + 1)
+        self.assertEqual(resp.encoding, resp.apparent_encoding)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2018 Mike Fährmann
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+
+import os
+import sys
+import zipfile
+import tempfile
+import unittest
+import unittest.mock
+
+import gallery_dl.downloader as downloader
+import gallery_dl.postprocessor as postprocessor
+from gallery_dl.output import NullOutput
+from gallery_dl.util import PathFormat
+
+
+class Extractor():
+    category = "test"
+    filename_fmt = "{name}.{extension}"
+    directory_fmt = ["{category}"]
+
+    def __init__(self, options):
+        self.options = options
+
+    def config(self, key, default=None):
+        return self.options.get(key, default)
+
+
+class TestPostprocessorBase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.pathfmt = PathFormat(Extractor({"base-directory": self.dir.name}))
+        self.pathfmt.set_directory({"category": "test"})
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _prepare(self, name, extension="txt"):
+        self.pathfmt.set_keywords({"name": name, "extension": extension})
+        return self.pathfmt
+
+
+class TestZipPP(TestPostprocessorBase):
+
+    def _store(self, pp, files):
+        """Create and archive 'files', a list of (directory, name)-tuples"""
+        futures = []
+        for directory, name in files:
+            self.pathfmt.set_directory({"category": directory})
+            pathfmt = self._prepare(name)
+            with pathfmt.open() as file:
+                file.write((directory + name).encode() * 1000)
+            futures.append(pp.run(pathfmt))
+        return futures
+
+    def _check(self, directory, names):
+        path = os.path.join(self.dir.name, directory + ".zip")
+        with zipfile.ZipFile(path) as zfile:
+            self.assertIsNone(zfile.testzip())
+            self.assertEqual(
+                zfile.namelist(), [name + ".txt" for name in names])
+            for name in names:
+                self.assertEqual(zfile.read(name + ".txt"),
+                                 (directory + name).encode() * 1000)
+
+    def test_zip_max_open(self):
+        pp = postprocessor.find("zip")(self.pathfmt, {"max-open": 1})
+        self._store(pp, (("a", "1"), ("b", "1"), ("a", "2"),
+                         ("c", "1"), ("b", "2"), ("a", "1")))
+        self.assertEqual(len(pp.archives), 1)
+        pp.finalize()
+
+        self._check("a", ("1", "2"))
+        self._check("b", ("1", "2"))
+        self._check("c", ("1",))
+
+    def test_zip_threads(self):
+        pp = postprocessor.find("zip")(self.pathfmt, {
+            "compression": "zip", "threads": 3, "max-open": 1})
+        files = [(directory, str(num))
+                 for num in range(10) for directory in "abc"]
+        futures = self._store(pp, files + [("a", "0"), ("b", "9")])
+        pp.finalize()
+
+        self.assertEqual(futures[-2:], [None, None])
+        for future in futures[:-2]:
+            self.assertIsNone(future.result())
+        for directory in "abc":
+            path = os.path.join(self.dir.name, directory + ".zip")
+            with zipfile.ZipFile(path) as zfile:
+                self.assertIsNone(zfile.testzip())
+                self.assertEqual(
+                    sorted(zfile.namelist()),
+                    sorted(str(num) + ".txt" for num in range(10)))
+                for info in zfile.infolist():
+                    self.assertEqual(info.compress_type, zipfile.ZIP_DEFLATED)
+
+    @unittest.skipIf(sys.version_info < (3, 6), "requires Python 3.6+")
+    def test_zip_stream(self):
+        pp = postprocessor.find("zip")(self.pathfmt, {"mode": "stream"})
+        dl = downloader.find("text")(None, NullOutput())
+        directory = self.pathfmt.realdirectory
+
+        for name in ("a", "b"):
+            pathfmt = self._prepare(name)
+            self.assertTrue(dl.download("text:" + name * 1000, pathfmt))
+            pp.run(pathfmt)
+            pathfmt.finalize()
+        pp.finalize()
+
+        self.assertFalse(os.path.exists(directory))
+        with zipfile.ZipFile(directory + ".zip") as zfile:
+            self.assertIsNone(zfile.testzip())
+            self.assertEqual(zfile.namelist(), ["a.txt", "b.txt"])
+            self.assertEqual(zfile.read("b.txt"), b"b" * 1000)
+
+    @unittest.skipIf(sys.version_info < (3, 6), "requires Python 3.6+")
+    def test_zip_stream_fixup(self):
+        pp = postprocessor.find("zip")(self.pathfmt, {"mode": "stream"})
+
+        # discard the data of a failed attempt
+        pathfmt = self._prepare("a")
+        with pathfmt.open() as file:
+            file.write(b"foo")
+        with pathfmt.open() as file:
+            file.write(b"bar")
+        pp.run(pathfmt)
+
+        # rename an entry after its filename changed
+        pathfmt = self._prepare("b")
+        with pathfmt.open() as file:
+            file.write(b"baz")
+        pathfmt.set_extension("jpeg")
+        pp.run(pathfmt)
+
+        # discard the entry of a failed download
+        with self._prepare("c").open() as file:
+            file.write(b"foo")
+        pp.finalize()
+
+        with zipfile.ZipFile(self.pathfmt.realdirectory + ".zip") as zfile:
+            self.assertIsNone(zfile.testzip())
+            self.assertEqual(zfile.namelist(), ["a.txt", "b.jpeg"])
+            self.assertEqual(zfile.read("a.txt"), b"bar")
+            self.assertEqual(zfile.read("b.jpeg"), b"baz")
+
+    @unittest.skipIf(sys.version_info >= (3, 6), "supported")
+    def test_zip_stream_unsupported(self):
+        with self.assertRaises(ValueError):
+            postprocessor.find("zip")(self.pathfmt, {"mode": "stream"})
+
+
+class TestDedupPP(TestPostprocessorBase):
+
+    def setUp(self):
+        TestPostprocessorBase.setUp(self)
+        postprocessor.find("dedup").seeded.clear()
+
+    def _create(self, name, content):
+        pathfmt = self._prepare(name)
+        with pathfmt.open() as file:
+            file.write(content)
+        return pathfmt
+
+    def _rows(self, pp):
+        return sorted(
+            os.path.basename(path)
+            for path, in pp.db.execute("SELECT path FROM files"))
+
+    def _same_file(self, name1, name2):
+        directory = self.pathfmt.realdirectory
+        return os.path.samefile(
+            os.path.join(directory, name1), os.path.join(directory, name2))
+
+    def test_dedup_hardlink(self):
+        pp = postprocessor.find("dedup")(self.pathfmt, {})
+        pp.run(self._create("a", b"foo"))
+        pp.run(self._create("b", b"bar"))
+        pathfmt = self._create("c", b"foo")
+        pp.run(pathfmt)
+        pathfmt.finalize()
+
+        self.assertTrue(self._same_file("a.txt", "c.txt"))
+        self.assertFalse(self._same_file("a.txt", "b.txt"))
+        self.assertEqual(self._rows(pp), ["a.txt", "b.txt"])
+        pp.finalize()
+
+    def test_dedup_link_error(self):
+        pp = postprocessor.find("dedup")(self.pathfmt, {})
+        pp.run(self._create("a", b"foo"))
+
+        with unittest.mock.patch("os.link", side_effect=OSError("error")):
+            pp.run(self._create("b", b"foo"))
+
+        self.assertFalse(self._same_file("a.txt", "b.txt"))
+        self.assertEqual(self._rows(pp), ["a.txt", "b.txt"])
+        self.assertFalse(os.path.exists(self.pathfmt.realpath + ".dedup"))
+        pp.finalize()
+
+    def test_dedup_stale(self):
+        pp = postprocessor.find("dedup")(self.pathfmt, {})
+        pp.run(self._create("a", b"foo"))
+        os.unlink(self.pathfmt.realpath)
+
+        pp.run(self._create("b", b"foo"))
+        self.assertEqual(self._rows(pp), ["b.txt"])
+
+        # outdated size in the database
+        pp.db.execute("UPDATE files SET size=0")
+        pp.run(self._create("c", b"foo"))
+        self.assertFalse(self._same_file("b.txt", "c.txt"))
+        self.assertEqual(self._rows(pp), ["c.txt"])
+        pp.finalize()
+
+    def test_dedup_seed(self):
+        directory = os.path.join(self.dir.name, "seed")
+        os.makedirs(directory)
+        for name, content in (("x.txt", b"foo"), ("y.txt", b"bar"),
+                              ("z.txt.part", b"foo")):
+            with open(os.path.join(directory, name), "wb") as file:
+                file.write(content)
+
+        pp = postprocessor.find("dedup")(
+            self.pathfmt, {"seed": directory, "threads": 2})
+        self.assertEqual(self._rows(pp), ["x.txt", "y.txt"])
+
+        pathfmt = self._create("a", b"foo")
+        pp.run(pathfmt)
+        self.assertTrue(os.path.samefile(
+            pathfmt.realpath, os.path.join(directory, "x.txt")))
+        pp.finalize()
+
+        # directories get scanned only once per process
+        with unittest.mock.patch("os.walk") as walk:
+            pp = postprocessor.find("dedup")(
+                self.pathfmt, {"seed": [directory]})
+            self.assertEqual(walk.call_count, 0)
+        pp.finalize()
+
+        # unchanged files do not get hashed again
+        postprocessor.find("dedup").seeded.clear()
+        with unittest.mock.patch(
+                "gallery_dl.postprocessor.dedup.hash_file") as hash_file:
+            pp = postprocessor.find("dedup")(
+                self.pathfmt, {"seed": [directory]})
+            self.assertEqual(hash_file.call_count, 0)
+        pp.finalize()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,7 @@
 # it under the terms of the GNU General Public License version 2 as
 # published by the Free Software Foundation.
 
+import re
 import unittest
 
 from gallery_dl import text
@@ -16,6 +17,19 @@ INVALID = ((), [], {}, None, 1, 2.3)
 INVALID_ALT = ((), [], {}, None, "")
 
 
+class FakeResponse():
+    """Streamed response returning its content in fixed-size chunks"""
+
+    def __init__(self, txt, size, encoding="utf-8"):
+        self.content = txt.encode(encoding)
+        self.encoding = encoding
+        self.size = size
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), self.size):
+            yield self.content[i:i+self.size]
+
+
 class TestText(unittest.TestCase):
 
     def test_clean_xml(self, f=text.clean_xml):
@@ -202,6 +216,20 @@ class TestText(unittest.TestCase):
         rdict, pos = f(txt, (), values=vdict)
         self.assertIs(vdict, rdict)
 
+    def test_compile_rules(self):
+        def f(txt, rules, pos=0, values=None):
+            return text.compile_rules(rules)(txt, pos, values)
+
+        # same results as extract_all()
+        self.test_extract_all(f)
+
+        # invalid arguments
+        rules = (("A", "[", "]"), (None, "[", "]"))
+        for value in INVALID:
+            self.assertEqual(f(value, rules), ({"A": None}, 0))
+        with self.assertRaises(TypeError):
+            text.compile_rules((("A", None, "]"),))
+
     def test_extract_iter(self, f=text.extract_iter):
         txt = "[c][b][a]: xyz! [d][e"
 
@@ -219,6 +247,28 @@ class TestText(unittest.TestCase):
         self.assertEqual(
             g(txt, "[", "]", 6), ["a", "d"])
 
+    def test_extract_iter_stream(self, f=text.extract_iter_stream):
+        txt = "[c][b][a]: xyz! [d][e <ä>[€][[ü]]"
+        result = ["c", "b", "a", "d", "e <ä>[€", "[ü"]
+
+        for size in range(1, 8):
+            self.assertEqual(
+                list(f(FakeResponse(txt, size), "[", "]")), result)
+            self.assertEqual(
+                list(f(FakeResponse(txt, size), "<ä", "[€]")), [">"])
+            self.assertEqual(
+                list(f(FakeResponse(txt, size), "X", "X")), [])
+        self.assertEqual(list(f(FakeResponse("", 1), "[", "]")), [])
+
+    def test_finditer_stream(self, f=text.finditer_stream):
+        txt = "http://a.b/ü https://c.d/1\nhttps://€.org/x\n 'http:/x'"
+        pattern = re.compile(r"https?://[^\s']+")
+        result = [m.group(0) for m in pattern.finditer(txt)]
+
+        for size in range(1, 8):
+            matches = f(FakeResponse(txt, size), pattern, overlap=8)
+            self.assertEqual([m.group(0) for m in matches], result)
+
     def test_parse_bytes(self, f=text.parse_bytes):
         self.assertEqual(f("0"), 0)
         self.assertEqual(f("50"), 50)
@@ -8,11 +8,18 @@
 # published by the Free Software Foundation.
 
 import unittest
+import unittest.mock
 import gallery_dl.util as util
 import gallery_dl.exception as exception
+import os
+import heapq
 import sys
+import time
 import random
 import string
+import sqlite3
+import tempfile
+import datetime
 
 
 class TestRange(unittest.TestCase):
@@ -93,6 +100,134 @@ class TestPredicate(unittest.TestCase):
         self.assertTrue(pred("text:123", dummy))
         self.assertTrue(pred("text:123", dummy))
 
+    def test_filter_predicate(self):
+        url = ""
+
+        pred = util.FilterPredicate("a < 3")
+        self.assertTrue(pred(url, {"a": 2}))
+        self.assertFalse(pred(url, {"a": 3}))
+
+        with self.assertRaises(exception.FilterError):
+            pred(url, {})
+        with self.assertRaises(exception.FilterError):
+            pred(url, {"a": "2"})
+
+        pred = util.FilterPredicate("abort()")
+        with self.assertRaises(exception.StopExtraction):
+            pred(url, {"a": 2})
+
+        # keywords take precedence over builtins
+        pred = util.FilterPredicate("id == 1 and len(tags) == 2")
+        self.assertTrue(pred(url, {"id": 1, "tags": ["a", "b"]}))
+        self.assertFalse(pred(url, {"id": 2, "tags": ["a", "b"]}))
+
+        # names bound in comprehensions and lambdas
+        pred = util.FilterPredicate(
+            "any(t == rating for t in tags) and (lambda x: x * 2)(a) == 4")
+        self.assertTrue(pred(url, {"a": 2, "rating": "s", "tags": "qs"}))
+        self.assertFalse(pred(url, {"a": 2, "rating": "e", "tags": "qs"}))
+
+        # constant folding
+        pred = util.FilterPredicate(
+            "date > datetime(2018, 1, 1) and size < 1024 * 1024")
+        self.assertNotIn("datetime", pred.func.__code__.co_names)
+        self.assertTrue(pred(url, {
+            "date": datetime.datetime(2018, 7, 1), "size": 1000}))
+        self.assertFalse(pred(url, {
+            "date": datetime.datetime(2017, 7, 1), "size": 1000}))
+
+        # same error message as eval() for undefined keywords
+        pred = util.FilterPredicate("a < 3 and d['b']")
+        with self.assertRaises(exception.FilterError) as cm:
+            pred(url, {"d": {}})
+        self.assertEqual(
+            str(cm.exception.args[0]), "name 'a' is not defined")
+        self.assertIsInstance(cm.exception.args[0], NameError)
+        with self.assertRaises(exception.FilterError) as cm:
+            pred(url, {"a": 1, "d": {}})
+        self.assertIsInstance(cm.exception.args[0], KeyError)
+
+    def test_hashed_unique_predicate(self):
+        dummy = None
+        hashes = util.HashSet()
+        pred1 = util.HashedUniquePredicate(hashes)
+        pred2 = util.HashedUniquePredicate(hashes)
+
+        # shared between predicates
+        self.assertTrue(pred1("1", dummy))
+        self.assertFalse(pred1("1", dummy))
+        self.assertFalse(pred2("1", dummy))
+        self.assertTrue(pred2("2", dummy))
+        self.assertFalse(pred1("2", dummy))
+
+        # duplicates for "text:"
+        self.assertTrue(pred1("text:123", dummy))
+        self.assertTrue(pred2("text:123", dummy))
+
+    def test_hash_set(self):
+        values = [random.getrandbits(64) for _ in range(5000)]
+
+        for limit in (None, 1000):
+            hashes = util.HashSet(limit)
+            hashes.BUFFER_SIZE = 100
+            for value in values:
+                hashes.add(value)
+                hashes.add(value)
+            self.assertEqual(len(hashes), len(set(values)))
+            for value in values:
+                self.assertIn(value, hashes)
+            self.assertNotIn(-1 & 0xFFFFFFFFFFFFFFFF, hashes)
+            if limit:
+                self.assertTrue(hashes.disk)
+                self.assertLessEqual(len(hashes.disk), 3)
+                self.assertLessEqual(len(hashes.runs), 4)
+            hashes.close()
+            self.assertEqual(hashes.disk, [])
+
+    def test_hash_set_spill(self):
+        hashes = util.HashSet(10)
+        hashes.BUFFER_SIZE = 11
+        written = []
+        merge = heapq.merge
+
+        def count(*runs):
+            written.append(sum(len(run) for run in runs))
+            return merge(*runs)
+
+        with unittest.mock.patch("heapq.merge", count):
+            for value in range(11 * 64):
+                hashes.add(value)
+
+        # each value gets rewritten once per merge, i.e. O(log n) times
+        self.assertEqual(len(written), 64)
+        self.assertLessEqual(sum(written), 11 * 64 * 7)
+        self.assertEqual(len(hashes.disk), 1)
+        self.assertEqual(len(hashes), 11 * 64)
+        hashes.close()
+
+    def test_parse_constraints(self):
+        self.assertEqual(util.parse_constraints(""), [])
+        self.assertEqual(util.parse_constraints("score >"), [])
+        self.assertEqual(util.parse_constraints("score"), [])
+        self.assertEqual(
+            util.parse_constraints("score > 100"),
+            [("score", ">", 100)])
+        self.assertEqual(
+            util.parse_constraints("100 <= score and rating == 's'"),
+            [("score", ">=", 100), ("rating", "==", "s")])
+        self.assertEqual(
+            util.parse_constraints("4000 < id <= 5000 and x < -1.5"),
+            [("id", ">", 4000), ("id", "<=", 5000), ("x", "<", -1.5)])
+        self.assertEqual(
+            util.parse_constraints("score > 10 and (id > 4 or id < 2)"),
+            [("score", ">", 10)])
+        self.assertEqual(
+            util.parse_constraints("score > 10 or id > 4"), [])
+        self.assertEqual(
+            util.parse_constraints("not score > 10 and id != 4"), [])
+        self.assertEqual(
+            util.parse_constraints("width > height and a.b > 1"), [])
+
     def test_build_predicate(self):
         pred = util.build_predicate([])
         self.assertIsInstance(pred, type(lambda: True))
@@ -153,6 +288,9 @@ class TestFormatter(unittest.TestCase):
         "title2": "",
         "title3": None,
         "title4": 0,
+        "width": 7,
+        "l": ["a", "b", "c"],
+        "d": {"a": "foo", "b": {"c": "bar"}},
     }
 
     def test_conversions(self):
@@ -210,12 +348,341 @@ class TestFormatter(unittest.TestCase):
         self._run_test("{a[:50]}", v[:50])
         self._run_test("{a[:]}"  , v)
 
+    def test_indexing(self):
+        self._run_test("{l[0]}", "a")
+        self._run_test("{l[2]}{l[1]}", "cb")
+        self._run_test("{d[a]}", "foo")
+        self._run_test("{d[b][c]}", "bar")
+        self._run_test("{b.__class__.__name__}", "str")
+
+    def test_nested_spec(self):
+        self._run_test("{title1:>{width}}", "  Title")
+        self._run_test("{title1:?{name}//}", "NameTitle")
+        self._run_test("{title2:?{name}//}", "")
+
+    def test_build(self):
+        formatter = util.Formatter()
+        func = formatter.build("{name}_{title1:?[/]/}{title3}.{ext:>4}")
+        self.assertEqual(func({"name": "A", "title1": "B", "ext": "jpg"}),
+                         "A_[B]None. jpg")
+        self.assertEqual(func({"name": "C", "ext": "png"}), "C_None. png")
+        self.assertEqual(formatter.build("")({}), "")
+        self.assertEqual(formatter.build("text")({}), "text")
+        self.assertEqual(formatter.build("{{}}")({}), "{}")
+
+        formatter.vformat("{name}", self.kwdict)
+        cached = formatter.format_cache["{name}"]
+        formatter.vformat("{name}", self.kwdict)
+        self.assertIs(formatter.format_cache["{name}"], cached)
+
     def _run_test(self, format_string, result, default=None):
         formatter = util.Formatter(default)
         output = formatter.vformat(format_string, self.kwdict)
         self.assertEqual(output, result, format_string)
 
 
+class TestPathFormat(unittest.TestCase):
+
+    class Extractor():
+        category = "test"
+        filename_fmt = "{name}.{extension}"
+        directory_fmt = ["{category}", "{dir}"]
+
+        def __init__(self, options):
+            self.options = options
+
+        def config(self, key, default=None):
+            return self.options.get(key, default)
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.extractor = self.Extractor({"base-directory": self.dir.name})
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_directory_cache(self):
+        kwdict = {"category": "test", "dir": "a", "name": "file",
+                  "extension": "txt"}
+        pathfmt = util.PathFormat(self.extractor)
+        os.mkdir(os.path.join(self.dir.name, "test"))
+
+        with unittest.mock.patch("os.makedirs", wraps=os.makedirs) as makedirs:
+            pathfmt.set_directory(kwdict)
+            pathfmt.set_directory(kwdict)
+            util.PathFormat(self.extractor).set_directory(kwdict)
+            self.assertEqual(makedirs.call_count, 1)
+
+            kwdict["dir"] = "b"
+            pathfmt.set_directory(kwdict)
+            self.assertEqual(makedirs.call_count, 2)
+
+        self.assertTrue(os.path.isdir(pathfmt.realdirectory))
+        self.assertIn(pathfmt.realdirectory, util.PathFormat.directories)
+
+    def test_directory_removed(self):
+        kwdict = {"category": "test", "dir": "c", "name": "file",
+                  "extension": "txt"}
+        pathfmt = util.PathFormat(self.extractor)
+        pathfmt.set_directory(kwdict)
+        os.rmdir(pathfmt.realdirectory)
+
+        pathfmt.set_keywords(kwdict)
+        with pathfmt.open() as file:
+            file.write(b"foobar")
+        self.assertTrue(os.path.isfile(pathfmt.realpath))
+
+        with self.assertRaises(FileNotFoundError):
+            pathfmt.temppath += ".missing"
+            pathfmt.open("r+b")
+
+    def test_finalize_directory_removed(self):
+        kwdict = {"category": "test", "dir": "d", "name": "file",
+                  "extension": "txt"}
+        pathfmt = util.PathFormat(self.extractor)
+        pathfmt.set_directory(kwdict)
+        pathfmt.set_keywords(kwdict)
+        pathfmt.temppath = os.path.join(self.dir.name, "file.part")
+        with pathfmt.open() as file:
+            file.write(b"foobar")
+        os.rmdir(pathfmt.realdirectory)
+
+        pathfmt.finalize()
+        self.assertTrue(os.path.isfile(pathfmt.realpath))
+        self.assertFalse(os.path.exists(pathfmt.temppath))
+
+    def test_part_size(self):
+        kwdict = {"category": "test", "dir": "g", "name": "file",
+                  "extension": "txt"}
+        pathfmt = util.PathFormat(self.extractor)
+        pathfmt.set_directory(kwdict)
+        pathfmt.set_keywords(kwdict)
+        pathfmt.part_enable()
+        self.assertEqual(pathfmt.part_size(), 0)
+
+        with pathfmt.open() as file:
+            file.write(b"foobar")
+        self.assertEqual(pathfmt.part_size(), 6)
+
+        pathfmt.set_part_size(3)
+        self.assertEqual(pathfmt.part_size(), 3)
+        pathfmt.set_part_size(None)
+        self.assertEqual(pathfmt.part_size(), 6)
+        self.assertFalse(os.path.exists(pathfmt.temppath + ".size"))
+
+    def test_finalize_cross_device(self):
+        kwdict = {"category": "test", "dir": "f", "name": "file",
+                  "extension": "txt"}
+        pathfmt = util.PathFormat(self.extractor)
+        pathfmt.set_directory(kwdict)
+        pathfmt.set_keywords(kwdict)
+        pathfmt.temppath = os.path.join(self.dir.name, "file.part")
+        with pathfmt.open() as file:
+            file.write(b"foobar")
+
+        replace = os.replace
+
+        def replace_exdev(src, dst):
+            if src == pathfmt.temppath:
+                raise OSError(18, "Invalid cross-device link")
+            return replace(src, dst)
+
+        moves = []
+        with unittest.mock.patch("os.replace", replace_exdev):
+            result = pathfmt.finalize(lambda *args: moves.append(args) or 1)
+            self.assertEqual(result, 1)
+            self.assertEqual(
+                moves, [(util.move_file, pathfmt.temppath, pathfmt.realpath)])
+            self.assertFalse(os.path.exists(pathfmt.realpath))
+
+            func, src, dst = moves[0]
+            func(src, dst)
+        with open(pathfmt.realpath, "rb") as file:
+            self.assertEqual(file.read(), b"foobar")
+        self.assertFalse(os.path.exists(pathfmt.temppath))
+        self.assertFalse(os.path.exists(pathfmt.realpath + ".part"))
+
+    def test_directory_scan(self):
+        directory = os.path.join(self.dir.name, "test", "e")
+        os.makedirs(directory)
+        for name in ("file1.jpg", "file2.png", "file3", "file5.part"):
+            open(os.path.join(directory, name), "w").close()
+
+        self.extractor.options["directory-scan"] = True
+        pathfmt = util.PathFormat(self.extractor)
+        pathfmt.set_directory({"category": "test", "dir": "e"})
+        self.assertEqual(
+            pathfmt.index, {"file1.jpg", "file2.png", "file3", "file5.part"})
+
+        with unittest.mock.patch("os.path.exists") as exists:
+            self._check(pathfmt, "file1", "jpg", True)
+            self._check(pathfmt, "file1", "png", False)
+            self._check(pathfmt, "file2", "png", True)
+            self._check(pathfmt, "file3", "", False)
+            self._check(pathfmt, "file4", "jpg", False)
+
+            # unknown extension
+            self._check(pathfmt, "file1", None, True)
+            self.assertEqual(pathfmt.keywords["extension"], "jpg")
+            self.assertTrue(pathfmt.realpath.endswith("file1.jpg"))
+            self._check(pathfmt, "file2", None, True)
+            self.assertEqual(pathfmt.keywords["extension"], "png")
+            self._check(pathfmt, "file3", None, False)
+            self._check(pathfmt, "file4", None, False)
+            self._check(pathfmt, "file5", None, False)
+            self.assertFalse(pathfmt.has_extension)
+            self.assertEqual(exists.call_count, 0)
+
+        # finalized files get added
+        self._check(pathfmt, "file4", "gif", False)
+        with pathfmt.open() as file:
+            file.write(b"foobar")
+        pathfmt.finalize()
+        self._check(pathfmt, "file4", "gif", True)
+        self._check(pathfmt, "file4", None, True)
+
+    def test_unknown_extension(self):
+        directory = os.path.join(self.dir.name, "test", "f")
+        os.makedirs(directory)
+        for name in ("file1.jpg", "file2.png", "file2.json", "file3",
+                     "file5.part", "file6.jpg.part.size", "file7.JSON"):
+            open(os.path.join(directory, name), "w").close()
+
+        pathfmt = util.PathFormat(self.extractor)
+        pathfmt.set_directory({"category": "test", "dir": "f"})
+        self.assertIsNone(pathfmt.stems)
+
+        with unittest.mock.patch("os.listdir", wraps=os.listdir) as listdir:
+            self._check(pathfmt, "file1", None, True)
+            self.assertEqual(pathfmt.keywords["extension"], "jpg")
+            self._check(pathfmt, "file2", None, True)
+            self.assertEqual(pathfmt.keywords["extension"], "png")
+            self._check(pathfmt, "file3", None, False)
+            self._check(pathfmt, "file4", None, False)
+            self._check(pathfmt, "file5", None, False)
+            self._check(pathfmt, "file6.jpg.part", None, False)
+            self._check(pathfmt, "file7", None, False)
+            self.assertEqual(listdir.call_count, 1)
+        self.assertIsNone(pathfmt.index)
+
+        # removed after the directory got listed
+        os.unlink(os.path.join(directory, "file2.png"))
+        self._check(pathfmt, "file2", None, False)
+
+    def _check(self, pathfmt, name, extension, result):
+        pathfmt.set_keywords({"name": name, "extension": extension})
+        self.assertEqual(pathfmt.exists(), result, (name, extension))
+
+
+class TestDownloadArchive(unittest.TestCase):
+
+    class Extractor():
+        category = "test"
+        archive_fmt = "{id}"
+
+        def __init__(self, batch=20):
+            self.batch = batch
+
+        def config(self, key, default=None):
+            return self.batch if key == "archive-batch" else default
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "archive.sqlite3")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_add_check(self):
+        archive = util.DownloadArchive(self.path, self.Extractor())
+        self.assertFalse(archive.check({"id": 1}))
+
+        archive.add({"id": 1})
+        self.assertTrue(archive.check({"id": 1}))
+        self.assertFalse(archive.check({"id": 2}))
+        self.assertEqual(len(archive.pending), 1)
+
+        archive.close()
+        archive = util.DownloadArchive(self.path, self.Extractor())
+        self.assertTrue(archive.check({"id": 1}))
+        self.assertFalse(archive.pending)
+        archive.close()
+
+    def test_batch(self):
+        archive = util.DownloadArchive(self.path, self.Extractor(3))
+        for i in range(7):
+            archive.add({"id": i})
+        self.assertEqual(len(archive.pending), 1)
+        self.assertEqual(archive.summary(), [("test", 6, 0)])
+        archive.close()
+
+    def test_query(self):
+        with open(os.path.join(self.dir.name, "file.jpg"), "wb") as file:
+            file.write(b"1234567890")
+        pathfmt = util.PathFormat.__new__(util.PathFormat)
+        pathfmt.path = pathfmt.realpath = file.name
+
+        archive = util.DownloadArchive(self.path, self.Extractor())
+        archive.add({"id": 1}, pathfmt)
+        archive.add({"id": 2}, pathfmt)
+        archive.category = "other"
+        archive.add({"id": 3})
+        archive.flush()
+
+        self.assertEqual(
+            archive.summary(), [("other", 1, 0), ("test", 2, 20)])
+        self.assertEqual(
+            archive.summary("test"), [("test", 2, 20)])
+        self.assertEqual(
+            archive.summary(since=time.time() + 100), [])
+
+        entries = list(archive.select("test"))
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]["entry"], "test1")
+        self.assertEqual(entries[0]["path"], file.name)
+        self.assertEqual(entries[0]["size"], 10)
+        self.assertIsInstance(entries[0]["timestamp"], int)
+        archive.close()
+
+    def test_upgrade(self):
+        con = sqlite3.connect(self.path)
+        con.execute("CREATE TABLE archive (entry PRIMARY KEY) WITHOUT ROWID")
+        con.execute("INSERT INTO archive VALUES ('test1')")
+        con.commit()
+        con.close()
+
+        archive = util.DownloadArchive(self.path, self.Extractor())
+        self.assertTrue(archive.check({"id": 1}))
+        archive.add({"id": 2})
+        archive.flush()
+        self.assertEqual(
+            archive.summary(), [(None, 1, 0), ("test", 1, 0)])
+        archive.close()
+
+    def test_readonly(self):
+        con = sqlite3.connect(self.path)
+        con.execute("CREATE TABLE archive (entry PRIMARY KEY) WITHOUT ROWID")
+        con.execute("INSERT INTO archive VALUES ('test1')")
+        con.commit()
+        schema = con.execute("SELECT * FROM sqlite_master").fetchall()
+        con.close()
+
+        archive = util.DownloadArchive(self.path, readonly=True)
+        self.assertEqual(archive.summary(), [(None, 1, 0)])
+        self.assertEqual(archive.summary("test"), [])
+        self.assertEqual(list(archive.select()), [{
+            "entry": "test1", "category": None, "path": None,
+            "size": None, "hash": None, "timestamp": None}])
+        with self.assertRaises(sqlite3.OperationalError):
+            archive.cursor.execute("INSERT INTO archive VALUES ('test2')")
+        archive.close()
+
+        con = sqlite3.connect(self.path)
+        self.assertEqual(
+            con.execute("SELECT * FROM sqlite_master").fetchall(), schema)
+        con.close()
+
+
 class TestOther(unittest.TestCase):
 
     def test_bencode(self):
@@ -249,6 +716,22 @@ class TestOther(unittest.TestCase):
         self.assertCountEqual(
             util.advance(util.advance(items, 1), 2), range(3, 5))
 
+    def test_copy_file(self):
+        data = os.urandom(100000)
+        with tempfile.TemporaryDirectory() as directory:
+            src = os.path.join(directory, "src")
+            dst = os.path.join(directory, "dst")
+            with open(src, "wb") as file:
+                file.write(data)
+
+            for functions in (util._COPY_FUNCTIONS, []):
+                with unittest.mock.patch.object(
+                        util, "_COPY_FUNCTIONS", functions):
+                    util.copy_file(src, dst)
+                with open(dst, "rb") as file:
+                    self.assertEqual(file.read(), data)
+                os.unlink(dst)
+
     def test_raises(self):
         self.assertRaises(Exception, util.raises(Exception()))
 